@@ -1,8 +1,67 @@
-import discord, os, asyncio
+import discord, io, os, asyncio, json, time
+from collections import deque
+from urllib.parse import quote_plus
 from discord.ext import commands
 from selenium import webdriver
 from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.common.by import By
+from selenium.common.exceptions import JavascriptException, NoSuchElementException
+from utils.driver_executor import DriverExecutor, PAGE_FACTS, run_query
+from utils.cache import LRUCache
+from utils.bookmarks import BookmarkStore
+from utils.navperf import NavPerf, ModeStats, NAV_TIMING_JS
+from utils.procmem import tree_rss
+from utils.tab_pool import TabPool
+from utils.imaging import fit_to_budget
+
+BOOKMARKS_PER_PAGE = 20 #Discord embeds cap out at 25 fields
+POLL_INTERVAL = 0.1 #Seconds between checks on a tab that's loading/waiting
+POLL_SLICE = 1.0 #Longest a loading tab keeps the driver once another command is waiting for it
+
+#Kicks off a navigation (or a reload with no url) without waiting for it, returning the old document's
+#timeOrigin and url so we can tell when the new one has replaced it (or, for a #hash change, when the url moved)
+BEGIN_NAVIGATION_JS = """
+const before = {origin: performance.timeOrigin, url: location.href};
+if (arguments[0]) location.href = arguments[0]; else location.reload();
+return before;
+"""
+
+#Watches for the first element matching the selector (once it has a link) and clicks it, leaving
+#{title, href} - or null once the deadline passes - in sessionStorage, which survives the click's navigation.
+#Uses a MutationObserver so the page does the waiting and we only read back one key.
+WATCH_FOR_VIDEO_JS = """
+const [selector, timeoutMs] = arguments;
+const KEY = "gubhubFirstVideo";
+sessionStorage.removeItem(KEY);
+const pick = () => {
+    const el = document.querySelector(selector);
+    if (!el || !el.href) return false;
+    sessionStorage.setItem(KEY, JSON.stringify({title: el.getAttribute("title") || el.textContent.trim(), href: el.href}));
+    el.click();
+    return true;
+};
+if (pick()) return;
+const timer = setTimeout(() => { observer.disconnect(); sessionStorage.setItem(KEY, "null"); }, timeoutMs);
+const observer = new MutationObserver(() => {
+    if (pick()) { observer.disconnect(); clearTimeout(timer); }
+});
+observer.observe(document.documentElement, {childList: true, subtree: true});
+"""
+READ_VIDEO_JS = 'return sessionStorage.getItem("gubhubFirstVideo");'
+
+LAUNCH_MODES = ["full", "lean"]
+
+#Lean mode lets images/autoplay back in for these sites. Runs in the browser's chrome (privileged) context
+ALLOW_SITES_JS = """
+const [domains] = arguments;
+for (const domain of domains) {
+    for (const origin of [`https://${domain}`, `https://www.${domain}`, `http://${domain}`]) {
+        const principal = Services.scriptSecurityManager.createContentPrincipalFromOrigin(origin);
+        Services.perms.addFromPrincipal(principal, "image", Services.perms.ALLOW_ACTION);
+        Services.perms.addFromPrincipal(principal, "autoplay-media", Services.perms.ALLOW_ACTION);
+    }
+}
+"""
 
 class FirefoxController(commands.Cog):
     """Control Firefox browser through Discord commands"""
@@ -11,18 +70,94 @@ class FirefoxController(commands.Cog):
         self.bot = bot
         self.driver = None
         self.browser_lock = asyncio.Lock()
-        self.bookmarks = {}  # Dictionary to store bookmarks {name: url}
+        self.bookmarks = BookmarkStore(os.getenv("BOOKMARK_DB", "bookmarks.db"))
+        #Every driver call goes through this one thread, in order
+        self.driver_ops = DriverExecutor()
+        #Per-domain navigation timings for !ffperf
+        self.navperf = NavPerf(window=int(os.getenv("NAVPERF_WINDOW", 200)))
+        self.nav_timeout = float(os.getenv("NAV_TIMEOUT", 30))
+
+        #Each user/channel gets its own tab, so one person's page load doesn't hold up everyone else's browsing
+        self.tabs = TabPool(
+            max_tabs=int(os.getenv("FIREFOX_MAX_TABS", 4)),
+            idle_timeout=float(os.getenv("TAB_IDLE_TIMEOUT", 600)),
+        )
+        self.tab_scope = os.getenv("TAB_LEASE_SCOPE", "channel").lower()
+        self.tab_lock = asyncio.Lock()
+        self.current_handle = None # the tab the driver is pointed at, only touched on the driver thread
+
+        #!youtube: how long to wait for results, and normalized query -> {title, href} of the video it resolved to
+        self.yt_timeout = float(os.getenv("YT_RESULT_TIMEOUT", 10))
+        self.yt_cache = LRUCache(
+            max_entries=int(os.getenv("YT_CACHE_SIZE", 128)),
+            ttl=float(os.getenv("YT_CACHE_TTL", 3600)),
+        )
+
+        #!ffshot: (url, scroll_y, selector) -> (jpeg, width, quality, encode ms), plus captures still in progress
+        self.shot_max_bytes = int(os.getenv("FFSHOT_MAX_BYTES", 2 * 1024 * 1024))
+        self.shot_max_width = int(os.getenv("FFSHOT_MAX_WIDTH", 1280))
+        self.shot_quality = int(os.getenv("FFSHOT_QUALITY", 80))
+        self.shot_cache = LRUCache(max_entries=16, ttl=float(os.getenv("FFSHOT_CACHE_TTL", 5)), sizeof=lambda shot: len(shot[0]))
+        self.shots_pending = {}
+
+        #Launch modes: "full" is the profile as-is, "lean" trims it down to go easy on the machine (and OBS)
+        self.default_mode = os.getenv("FIREFOX_MODE", "full").lower()
+        if self.default_mode not in LAUNCH_MODES:
+            print(f"Unknown FIREFOX_MODE '{self.default_mode}', falling back to full")
+            self.default_mode = "full"
+        self.lean_allow = [d.strip().lower() for d in os.getenv("LEAN_ALLOW_DOMAINS", "").split(",") if d.strip()]
+        self.lean_processes = int(os.getenv("LEAN_PROCESS_COUNT", 2))
+        self.lean_cache_mb = int(os.getenv("LEAN_CACHE_MB", 32))
+        self.mode = None # mode of the running driver
+        self.mode_stats = {mode: ModeStats() for mode in LAUNCH_MODES}
+
+        #Warm standby: a driver launched in the background, handed over instantly by !ffstart
+        self.prelaunch = os.getenv("FIREFOX_PRELAUNCH", "0") == "1"
+        self.standby = None
+        self.standby_mode = None
+
+        #Memory watchdog: samples the browser's process tree and recycles the driver once it gets too big or too old
+        self.mem_interval = float(os.getenv("FF_MEM_INTERVAL", 30))
+        self.mem_limit = int(os.getenv("FF_MEM_LIMIT_MB", 2048)) * 2**20 # 0 = no limit
+        self.max_age = float(os.getenv("FF_MAX_AGE_HOURS", 6)) * 3600 # 0 = no limit
+        self.recycle_idle = float(os.getenv("FF_RECYCLE_IDLE", 15)) # quiet seconds needed before recycling
+        self.mem_samples = deque(maxlen=120) # (time, rss bytes, process count)
+        self.recycles = deque(maxlen=10) # recent recycle events, newest last
+        self.recycle_reason = None # set once a threshold is crossed, cleared when the recycle happens
+        self.driver_started = None
+        self.watchdog_task = None
+        self.standby_task = None
+
+    async def cog_load(self):
+        """Load bookmarks and kick off the standby launch as soon as the cog loads"""
+        if self.prelaunch:
+            self._spawn_standby()
+        if self.mem_interval > 0:
+            self.watchdog_task = asyncio.create_task(self._watchdog())
+        try:
+            start = time.perf_counter()
+            count = await self.bookmarks.load()
+            print(f"Loaded {count} bookmarks in {(time.perf_counter() - start) * 1000:.1f}ms")
+        except Exception as e:
+            print(f"Failed to load bookmarks: {e}")
     
     async def cog_unload(self):
         """Clean up when cog is unloaded"""
-        if self.driver:
-            self.driver.quit()
-    
-    @commands.command(name="ffstart")
-    async def start_browser(self, ctx):
-        """Start the Firefox browser
-        
-        Usage: !start 
+        if self.standby_task:
+            self.standby_task.cancel()
+        if self.watchdog_task:
+            self.watchdog_task.cancel()
+        for driver in (self.driver, self.standby):
+            if driver:
+                await self.driver_ops.run("quit", driver.quit)
+        self.driver_ops.shutdown()
+        self.bookmarks.close()
+
+    def _launch_driver(self, mode):
+        """Build a profile-backed Firefox driver in the given mode. Blocking, takes a few seconds - keep it off the loop
+
+        Launching runs on its own thread rather than the driver thread: the new driver isn't shared
+        with anything yet, and a multi-second launch shouldn't hold up calls on a live session.
         """
 
         #Loads the users specified profile to persist things like plugins/bookmarks
@@ -30,7 +165,344 @@ class FirefoxController(commands.Cog):
         user=os.environ.get("USERNAME")
         profile=f"C:/Users/{user}/AppData/Roaming/Mozilla/Firefox/Profiles/{profile_name}"
         print(f"Firefox Profile: {profile}")
+
+        options = Options()
+        options.add_argument("-profile")
+        options.add_argument(profile)
+        if mode == "lean":
+            options.set_preference("permissions.default.image", 2) # no images
+            options.set_preference("media.autoplay.default", 5) # no autoplay, with or without sound
+            options.set_preference("dom.ipc.processCount", self.lean_processes)
+            options.set_preference("dom.ipc.processCount.webIsolated", 1)
+            options.set_preference("browser.cache.memory.capacity", self.lean_cache_mb * 1024) # KB
+            options.set_preference("browser.cache.disk.capacity", self.lean_cache_mb * 1024)
+            if self.lean_allow:
+                options.add_argument("-remote-allow-system-access") # needed for the chrome context below
+
+        driver = webdriver.Firefox(options=options)
+        if mode == "lean" and self.lean_allow:
+            try:
+                with driver.context(driver.CONTEXT_CHROME):
+                    driver.execute_script(ALLOW_SITES_JS, self.lean_allow)
+            except Exception as e:
+                print(f"Failed to allow images/autoplay for {', '.join(self.lean_allow)}: {e}")
+        return driver
+
+    async def _launch(self, mode):
+        start = time.perf_counter()
+        driver = await asyncio.to_thread(self._launch_driver, mode)
+        self.mode_stats[mode].launch_ms.append((time.perf_counter() - start) * 1000)
+        return driver
+
+    def _spawn_standby(self):
+        """Start launching a standby driver in the background, unless one is ready or on its way
+
+        The profile can only be open in one Firefox at a time, so this only runs while no session is active.
+        """
+        if not self.prelaunch or self.driver or self.standby:
+            return
+        if self.standby_task and not self.standby_task.done():
+            return
+        self.standby_task = asyncio.create_task(self._prepare_standby())
+
+    async def _prepare_standby(self):
+        try:
+            self.standby = await self._launch(self.default_mode)
+            self.standby_mode = self.default_mode
+            print(f"Firefox standby ready ({self.default_mode})")
+        except Exception as e:
+            print(f"Failed to prelaunch Firefox: {e}")
+
+    async def _acquire_driver(self, mode):
+        """Hand over the standby driver if there is one (waiting on it if it's mid-launch), else launch one"""
+        if self.standby is None and self.standby_task and not self.standby_task.done():
+            await self.standby_task
+
+        if self.standby is not None:
+            driver, self.standby = self.standby, None
+            if self.standby_mode == mode:
+                return driver, True
+            #Launched in the other mode, and the profile can't be open twice
+            await asyncio.to_thread(driver.quit)
+
+        return await self._launch(mode), False
+
+    def _live_handles(self, driver):
+        """Open window handles, or None if the session is gone - driver thread only"""
+        try:
+            handles = driver.window_handles
+        except Exception:
+            return None
+        if self.current_handle not in handles:
+            self.current_handle = None
+        return handles or None
+
+    async def _check_driver(self):
+        """After a failed command, forget tabs closed by hand, or drop the driver if Firefox crashed and get a replacement warming up"""
+        if not self.driver:
+            return
+        handles = await self.driver_ops.run("health", self._live_handles, self.driver)
+        if handles:
+            dropped = self.tabs.retain(handles)
+            if dropped:
+                print(f"Forgot {dropped} tab(s) that were closed outside the bot")
+            return
+
+        print("Firefox session died, dropping driver")
+        self.tabs.clear()
+        driver, self.driver = self.driver, None
+        try:
+            await self.driver_ops.run("quit", driver.quit)
+        except Exception:
+            pass
+        self._spawn_standby()
+
+    #Tabs
+    def _adopt_driver(self, driver):
+        """Point at a fresh driver's first window and return its handle - driver thread only"""
+        self.current_handle = driver.current_window_handle
+        return self.current_handle
+
+    def _use_tab(self, handle):
+        """Point the driver at a tab, skipping the switch if it's already there - driver thread only"""
+        if self.current_handle != handle:
+            self.driver.switch_to.window(handle)
+            self.current_handle = handle
+
+    def _new_tab(self):
+        self.driver.switch_to.new_window("tab")
+        self.current_handle = self.driver.current_window_handle
+        return self.current_handle
+
+    def _close_tab(self, handle, fallback):
+        self._use_tab(handle)
+        self.driver.close()
+        self.driver.switch_to.window(fallback)
+        self.current_handle = fallback
+
+    async def _on_tab(self, tab, op, fn, *args):
+        """Run fn(*args) on the driver thread with the driver pointed at tab. Returns (result, timing)"""
+        def call():
+            self._use_tab(tab.handle)
+            return fn(*args)
+        return await self.driver_ops.run_timed(op, call)
+
+    async def _close(self, tab):
+        """Close a tab, unless it's the last one (that would end the session)"""
+        fallback = next((handle for handle in self.tabs.tabs if handle != tab.handle), None)
+        if fallback is None:
+            return False
+        self.tabs.remove(tab.handle)
+        await self.driver_ops.run("close_tab", self._close_tab, tab.handle, fallback)
+        return True
+
+    def _owner(self, ctx):
+        if self.tab_scope == "user":
+            return ctx.author.id, ctx.author.display_name
+        return ctx.channel.id, f"#{ctx.channel}"
+
+    async def _tab(self, ctx):
+        """The caller's tab, leasing one the first time: a free tab, a new one, or the least recently used once at the cap"""
+        owner, label = self._owner(ctx)
+        tab = self.tabs.tab_for(owner)
+        if tab:
+            return tab
+
+        async with self.tab_lock:
+            tab = self.tabs.tab_for(owner)
+            if tab:
+                return tab
+
+            for stale in self.tabs.expired():
+                await self._close(stale)
+
+            tab = self.tabs.unleased()
+            if tab is None and self.tabs.full:
+                #Take over the least recently used tab rather than growing past the cap
+                tab = self.tabs.lru_idle()
+                self.tabs.release(tab.handle)
+            elif tab is None:
+                tab = self.tabs.add(await self.driver_ops.run("new_tab", self._new_tab))
+            self.tabs.assign(owner, tab, label)
+            return tab
+
+    async def _wait_on_tab(self, tab, op, script, until, timeout, *args):
+        """Re-run script on tab every POLL_INTERVAL until until(result) or timeout seconds pass
+
+        Polling happens in driver jobs that stay on the tab instead of switching to it for every check,
+        since switching windows brings the tab to the front in Firefox and two loading tabs taking turns
+        would flip the on-stream browser back and forth. A job keeps polling while nothing else wants the
+        driver, and hands it over after POLL_SLICE seconds once something does, so other tabs' commands
+        interleave with a slow load and overlapping loads swap at most once per slice.
+        Returns the last result, the ms spent queued for the driver and the ms spent running script.
+        """
+        deadline = time.monotonic() + timeout
+
+        def poll_slice():
+            slice_end = time.monotonic() + POLL_SLICE
+            script_ms = 0.0
+            result = None
+            while True:
+                time.sleep(POLL_INTERVAL)
+                start = time.perf_counter()
+                try:
+                    result = self.driver.execute_script(script, *args)
+                    done = until(result)
+                except JavascriptException:
+                    #Caught the page mid-unload, just check again
+                    if time.monotonic() > deadline:
+                        raise
+                    done = False
+                finally:
+                    script_ms += (time.perf_counter() - start) * 1000
+                if done or time.monotonic() > deadline:
+                    return True, result, script_ms
+                #This job counts as one, so anything more is another command waiting its turn
+                if self.driver_ops.pending > 1 and time.monotonic() > slice_end:
+                    return False, result, script_ms
+
+        wait_ms = script_ms = 0.0
+        while True:
+            (done, result, slice_ms), timing = await self._on_tab(tab, op, poll_slice)
+            wait_ms += timing["wait"]
+            script_ms += slice_ms
+            if done:
+                return result, wait_ms, script_ms
+
+    async def _open(self, tab, url=None):
+        """Load url in tab (or reload it with no url) and wait for it to finish, recording how long each phase took"""
+        with tab.in_use():
+            before, timing = await self._on_tab(tab, "navigate", self.driver.execute_script, BEGIN_NAVIGATION_JS, url)
+            origin = before["origin"]
+            #A new document, or for a same-document (#hash) navigation just the url moving
+            page, wait_ms, run_ms = await self._wait_on_tab(
+                tab, "navigate_poll", NAV_TIMING_JS,
+                lambda page: page["ready_state"] == "complete" and (page["time_origin"] != origin or page["url"] != before["url"]),
+                self.nav_timeout,
+            )
+        tab.url, tab.title = page["url"], page["title"]
+        #Only count it if the new document actually replaced the old one
+        if page["time_origin"] != origin:
+            self.navperf.record(page["url"], page["timing"], timing["wait"] + wait_ms, timing["run"] + run_ms)
+            await self._record_mode_load(page["timing"])
+        return page
+
+    async def _record_mode_load(self, browser_timing):
+        try:
+            rss, _ = await asyncio.to_thread(tree_rss, self.driver.service.process.pid)
+        except Exception:
+            rss = None
+        self.mode_stats[self.mode].record_load(browser_timing, rss)
+    
+    #Memory watchdog
+    async def _sample_memory(self):
+        rss, procs = await asyncio.to_thread(tree_rss, self.driver.service.process.pid)
+        self.mem_samples.append((time.time(), rss, procs))
+        return rss
+
+    def _idle(self):
+        """Nothing queued or loading, and no driver calls for a while"""
+        return (
+            self.driver_ops.pending == 0
+            and not any(tab.busy for tab in self.tabs.numbered())
+            and time.monotonic() - self.driver_ops.last_active >= self.recycle_idle
+        )
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(self.mem_interval)
+            if not self.driver:
+                continue
+            try:
+                rss = await self._sample_memory()
+                if self.recycle_reason is None:
+                    if self.mem_limit and rss > self.mem_limit:
+                        self.recycle_reason = f"memory {rss / 2**20:.0f}MB over {self.mem_limit / 2**20:.0f}MB"
+                    elif self.max_age and time.monotonic() - self.driver_started > self.max_age:
+                        self.recycle_reason = f"running over {self.max_age / 3600:g}h"
+                    if self.recycle_reason:
+                        print(f"Firefox needs recycling ({self.recycle_reason}), waiting for a quiet moment")
+
+                if self.recycle_reason and self._idle():
+                    await self._recycle(self.recycle_reason)
+            except Exception as e:
+                print(f"Firefox memory watchdog error: {e}")
+
+    async def _recycle(self, reason):
+        """Restart Firefox in the same mode and reopen every tab where it was, keeping everyone's leases
+
+        Returns the recorded event, or None if Firefox was stopped in the meantime.
+        """
+        async with self.browser_lock, self.tab_lock:
+            if not self.driver:
+                return None
+            start = time.perf_counter()
+            before = self.mem_samples[-1][1] if self.mem_samples else 0
+
+            #Remember where every tab actually is (people may have clicked around since we navigated)
+            old_tabs = self.tabs.numbered()
+            leases, labels = dict(self.tabs.leases), dict(self.tabs.labels)
+            urls = []
+            for tab in old_tabs:
+                try:
+                    page, _ = await self._on_tab(tab, "query", run_query, self.driver, {"url": PAGE_FACTS["url"]})
+                    urls.append(page["url"])
+                except Exception:
+                    urls.append(tab.url)
+
+            driver, self.driver = self.driver, None
+            self.tabs.clear()
+            try:
+                await self.driver_ops.run("quit", driver.quit)
+            except Exception:
+                pass
+
+            #Launching happens on its own thread, like !ffstart
+            try:
+                self.driver = await self._launch(self.mode)
+            except Exception:
+                self._spawn_standby()
+                raise
+            self.driver_started = time.monotonic()
+            self.recycle_reason = None
+            self.mem_samples.clear()
+
+            new_tabs = {}
+            for i, old in enumerate(old_tabs):
+                op, fn = ("adopt", lambda: self._adopt_driver(self.driver)) if i == 0 else ("new_tab", self._new_tab)
+                new_tabs[old.handle] = self.tabs.add(await self.driver_ops.run(op, fn))
+            if not new_tabs:
+                self.tabs.add(await self.driver_ops.run("adopt", self._adopt_driver, self.driver))
+            for owner, handle in leases.items():
+                if handle in new_tabs:
+                    self.tabs.assign(owner, new_tabs[handle], labels.get(owner))
+
+        #Pages load in parallel, outside the locks so commands can carry on meanwhile
+        restore = [self._open(new_tabs[old.handle], url) for old, url in zip(old_tabs, urls) if url.startswith("http")]
+        results = await asyncio.gather(*restore, return_exceptions=True)
+        after = await self._sample_memory()
+
+        event = {
+            "when": time.time(), "reason": reason, "before": before, "after": after,
+            "tabs": sum(1 for result in results if not isinstance(result, Exception)),
+            "seconds": time.perf_counter() - start,
+        }
+        self.recycles.append(event)
+        print(f"Recycled Firefox ({reason}): {before / 2**20:.0f}MB -> {after / 2**20:.0f}MB, "
+              f"{event['tabs']} tab(s) restored in {event['seconds']:.1f}s")
+        return event
+
+    @commands.command(name="ffstart")
+    async def start_browser(self, ctx, mode: str = None):
+        """Start the Firefox browser, optionally in lean mode (no images/autoplay, fewer processes, smaller cache)
         
+        Usage: !ffstart [full|lean]
+        """
+        mode = (mode or self.default_mode).lower()
+        if mode not in LAUNCH_MODES:
+            await ctx.send(f"Unknown mode `{mode}`. Options: {', '.join(LAUNCH_MODES)}")
+            return
+
         async with self.browser_lock:
             if self.driver:
                 await ctx.send("Firefox is already running!")
@@ -38,11 +510,14 @@ class FirefoxController(commands.Cog):
             
             async with ctx.typing():
                 try:
-                    options = Options()
-                    options.add_argument("-profile")
-                    options.add_argument(profile)
-                    self.driver = webdriver.Firefox(options=options)
-                    await ctx.send(f"Firefox started")
+                    self.driver, warm = await self._acquire_driver(mode)
+                    self.mode = mode
+                    self.driver_started = time.monotonic()
+                    self.recycle_reason = None
+                    self.mem_samples.clear()
+                    self.tabs.clear()
+                    self.tabs.add(await self.driver_ops.run("adopt", self._adopt_driver, self.driver))
+                    await ctx.send(f"Firefox started in {mode} mode" + (" (warm standby)" if warm else ""))
                 except Exception as e:
                     await ctx.send(f"Error starting Firefox: {str(e)}")
     
@@ -55,11 +530,16 @@ class FirefoxController(commands.Cog):
                 return
             
             try:
-                self.driver.quit()
-                self.driver = None
+                driver, self.driver = self.driver, None
+                self.tabs.clear()
+                self.recycle_reason = None
+                await self.driver_ops.run("quit", driver.quit)
                 await ctx.send("Firefox stopped!")
             except Exception as e:
                 await ctx.send(f"Error stopping Firefox: {str(e)}")
+            finally:
+                #Get the next session warming up now the profile is free again
+                self._spawn_standby()
     
     @commands.command(name="goto", aliases=["url"])
     async def goto_url(self, ctx, url: str):
@@ -76,12 +556,25 @@ class FirefoxController(commands.Cog):
                 if not url.startswith(('http://', 'https://')):
                     url = 'https://' + url
                 
-                await asyncio.to_thread(self.driver.get, url)
-                title = await asyncio.to_thread(lambda: self.driver.title)
-                await ctx.send(f"Navigated to: {url}\nPage title: {title}")
+                page = await self._open(await self._tab(ctx), url)
+                await ctx.send(f"Navigated to: {url}\nPage title: {page['title']}")
             except Exception as e:
                 await ctx.send(f"Error navigating: {str(e)}")
+                await self._check_driver()
     
+    async def _play_first_result(self, tab, search_url):
+        """Open a YouTube search in tab and click the first video as soon as it renders"""
+        await self._open(tab, search_url)
+        with tab.in_use():
+            await self._on_tab(tab, "youtube_search", self.driver.execute_script, WATCH_FOR_VIDEO_JS, "a#video-title", int(self.yt_timeout * 1000))
+            #The page reports its own timeout, ours is only a backstop
+            raw, _, _ = await self._wait_on_tab(tab, "youtube_poll", READ_VIDEO_JS, lambda raw: raw is not None, self.yt_timeout + 2)
+        return json.loads(raw) if raw else None
+
+    @staticmethod
+    def _normalize_query(query):
+        return " ".join(query.lower().split())
+
     @commands.command(name="youtube", aliases=["yt"])
     async def search_youtube(self, ctx, *, query: str):
         """Search for a video on YouTube and open the first result
@@ -94,29 +587,41 @@ class FirefoxController(commands.Cog):
         
         async with ctx.typing():
             try:
-                # Navigate to YouTube search
-                search_url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
-                await asyncio.to_thread(self.driver.get, search_url)
-                
-                # Wait a moment for the page to load
-                await asyncio.sleep(2)
-                
-                # Find and click the first video result
-                first_video = await asyncio.to_thread(
-                    self.driver.find_element, 
-                    By.CSS_SELECTOR, 
-                    "a#video-title"
-                )
-                
-                video_title = await asyncio.to_thread(lambda: first_video.get_attribute("title"))
-                video_url = await asyncio.to_thread(lambda: first_video.get_attribute("href"))
-                
-                # Click the video
-                await asyncio.to_thread(first_video.click)
-                
-                await ctx.send(f"Playing: **{video_title}**\n{video_url}")
+                # Seen this search recently, skip the results page and go straight to the video
+                key = self._normalize_query(query)
+                tab = await self._tab(ctx)
+                cached = self.yt_cache.get(key)
+                if cached:
+                    await self._open(tab, cached["href"])
+                    await ctx.send(f"Playing: **{cached['title']}**\n{cached['href']} (cached)")
+                    return
+
+                # Navigate to YouTube search and wait for the first result to actually show up
+                search_url = f"https://www.youtube.com/results?search_query={quote_plus(query)}"
+                first_video = await self._play_first_result(tab, search_url)
+                if not first_video:
+                    await ctx.send(f"Error searching YouTube: no video results after {self.yt_timeout:.0f}s")
+                    return
+
+                self.yt_cache.put(key, first_video)
+                await ctx.send(f"Playing: **{first_video['title']}**\n{first_video['href']}")
             except Exception as e:
                 await ctx.send(f"Error searching YouTube: {str(e)}")
+                await self._check_driver()
+
+    @commands.command(name="ytcache")
+    async def youtube_cache(self, ctx, action: str = None):
+        """Show YouTube result cache stats, or clear it. Usage: !ytcache [clear]"""
+        if action and action.lower() == "clear":
+            self.yt_cache.clear()
+            await ctx.send("YouTube cache cleared")
+            return
+
+        cache = self.yt_cache
+        await ctx.send(
+            f"YouTube cache: {len(cache)}/{cache.max_entries} searches, TTL {cache.ttl / 60:.0f} min\n"
+            f"Hits: {cache.hits} | Misses: {cache.misses} | Hit rate: {cache.hit_rate:.0%}"
+        )
     
     @commands.command(name="ffrefresh")
     async def refresh(self, ctx):
@@ -126,10 +631,11 @@ class FirefoxController(commands.Cog):
             return
         
         try:
-            await asyncio.to_thread(self.driver.refresh)
+            await self._open(await self._tab(ctx))
             await ctx.send("Page refreshed")
         except Exception as e:
             await ctx.send(f"Error: {str(e)}")
+            await self._check_driver()
     
     @commands.command(name="ffinfo")
     async def get_info(self, ctx):
@@ -140,8 +646,11 @@ class FirefoxController(commands.Cog):
         
         async with ctx.typing():
             try:
-                url = await asyncio.to_thread(lambda: self.driver.current_url)
-                title = await asyncio.to_thread(lambda: self.driver.title)
+                page, _ = await self._on_tab(
+                    await self._tab(ctx), "query", run_query, self.driver,
+                    {"url": PAGE_FACTS["url"], "title": PAGE_FACTS["title"]},
+                )
+                url, title = page["url"], page["title"]
                 
                 embed = discord.Embed(
                     title="Page Info", 
@@ -161,6 +670,7 @@ class FirefoxController(commands.Cog):
                 await ctx.send(embed=embed)
             except Exception as e:
                 await ctx.send(f"Error getting info: {str(e)}")
+                await self._check_driver()
     
     @commands.command(name="execute")
     async def execute_js(self, ctx, *, code: str):
@@ -174,7 +684,7 @@ class FirefoxController(commands.Cog):
         
         async with ctx.typing():
             try:
-                result = await asyncio.to_thread(self.driver.execute_script, code)
+                result, _ = await self._on_tab(await self._tab(ctx), "execute", self.driver.execute_script, code)
                 result_str = str(result) if result is not None else "No return value"
                 
                 if len(result_str) > 1900:
@@ -183,6 +693,68 @@ class FirefoxController(commands.Cog):
                 await ctx.send(f"JavaScript executed!\n```\n{result_str}\n```")
             except Exception as e:
                 await ctx.send(f"Error executing JavaScript: {str(e)}")
+                await self._check_driver()
+
+    def _capture(self, selector):
+        """PNG of the viewport, or of the first element matching selector - driver thread only"""
+        if selector:
+            return self.driver.find_element(By.CSS_SELECTOR, selector).screenshot_as_png
+        return self.driver.get_screenshot_as_png()
+
+    async def _capture_and_encode(self, tab, selector):
+        with tab.in_use():
+            png, _ = await self._on_tab(tab, "screenshot", self._capture, selector)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.bot.process_pool, fit_to_budget, png, self.shot_max_bytes, self.shot_max_width, self.shot_quality
+        )
+
+    async def _shoot(self, tab, key, selector):
+        """Capture and encode once for key, sharing the result with identical requests that come in meanwhile"""
+        task = self.shots_pending.get(key)
+        if task is None:
+            task = self.shots_pending[key] = asyncio.create_task(self._capture_and_encode(tab, selector))
+            task.add_done_callback(lambda _: self.shots_pending.pop(key, None))
+        shot = await asyncio.shield(task)
+        self.shot_cache.put(key, shot)
+        return shot
+
+    @commands.command(name="ffshot")
+    async def page_screenshot(self, ctx, *, selector: str = None):
+        """Post a screenshot of the page, or of one element on it
+
+        Usage: !ffshot [css selector]
+        """
+        if not self.driver:
+            await ctx.send("Firefox is not running!")
+            return
+
+        async with ctx.typing():
+            try:
+                start = time.perf_counter()
+                tab = await self._tab(ctx)
+                page, _ = await self._on_tab(
+                    tab, "query", run_query, self.driver,
+                    {"url": PAGE_FACTS["url"], "scroll_y": PAGE_FACTS["scroll_y"]},
+                )
+                key = (page["url"], page["scroll_y"], selector)
+                shot = self.shot_cache.get(key)
+                source = "cached" if shot else "fresh"
+                if shot is None:
+                    shot = await self._shoot(tab, key, selector)
+
+                data, width, quality, _ = shot
+                elapsed = (time.perf_counter() - start) * 1000
+                await ctx.send(
+                    f"Page screenshot ({source}, {width}px, {len(data) / 1024:.0f}KB at quality {quality}, ready in {elapsed:.0f}ms)",
+                    file=discord.File(io.BytesIO(data), filename="page.jpg"),
+                )
+            except NoSuchElementException:
+                await ctx.send(f"No element matches `{selector}`")
+            except Exception as e:
+                await ctx.send(f"Error taking page screenshot: {str(e)}")
+                await self._check_driver()
+
     #Bookmarks 
     @commands.command(name="bookmark", aliases=["addbookmark"])
     async def add_bookmark(self, ctx, name: str, url: str = None):
@@ -197,16 +769,20 @@ class FirefoxController(commands.Cog):
                 return
             
             try:
-                url = await asyncio.to_thread(lambda: self.driver.current_url)
+                url, _ = await self._on_tab(await self._tab(ctx), "current_url", lambda: self.driver.current_url)
             except Exception as e:
                 await ctx.send(f"Error getting current URL: {str(e)}")
+                await self._check_driver()
                 return
         else:
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
         
-        self.bookmarks[name.lower()] = url
-        await ctx.send(f"Bookmark added: **{name}** → {url}")
+        try:
+            await self.bookmarks.set(name.lower(), url)
+            await ctx.send(f"Bookmark added: **{name}** → {url}")
+        except Exception as e:
+            await ctx.send(f"Error saving bookmark: {str(e)}")
     
     @commands.command(name="unbookmark", aliases=["removebookmark", "delbookmark", "deletebookmark"])
     async def remove_bookmark(self, ctx, name: str):
@@ -214,25 +790,38 @@ class FirefoxController(commands.Cog):
         
         Usage: !unbookmark <name>
         """
-        name_lower = name.lower()
-        if name_lower in self.bookmarks:
-            url = self.bookmarks.pop(name_lower)
+        try:
+            url = await self.bookmarks.remove(name.lower())
+        except Exception as e:
+            await ctx.send(f"Error removing bookmark: {str(e)}")
+            return
+
+        if url is not None:
             await ctx.send(f"Bookmark removed: **{name}** ({url})")
         else:
             await ctx.send(f"Bookmark not found: **{name}**")
     
     @commands.command(name="bookmarks")
-    async def list_bookmarks(self, ctx):
-        """List all saved bookmarks"""
-        if not self.bookmarks:
+    async def list_bookmarks(self, ctx, page: int = 1):
+        """List saved bookmarks, a page at a time
+        
+        Usage: !bookmarks [page]
+        """
+        if not len(self.bookmarks):
             await ctx.send("No bookmarks saved yet!")
             return
         
+        entries, pages = self.bookmarks.page(page, BOOKMARKS_PER_PAGE)
+        if not entries:
+            await ctx.send(f"Pick a page from 1 to {pages}")
+            return
+        
         embed = discord.Embed(title="Saved Bookmarks", color=discord.Color.blue())
-        for name, url in self.bookmarks.items():
+        for name, url in entries:
             # Truncate long URLs for display
             display_url = url if len(url) <= 50 else url[:47] + "..."
             embed.add_field(name=name.title(), value=display_url, inline=False)
+        embed.set_footer(text=f"Page {page}/{pages} - {len(self.bookmarks)} bookmarks")
         
         await ctx.send(embed=embed)
     
@@ -248,17 +837,224 @@ class FirefoxController(commands.Cog):
         
         name_lower = name.lower()
         if name_lower not in self.bookmarks:
-            await ctx.send(f"Bookmark not found: **{name}**\nUse `!bookmarks` to see available bookmarks.")
-            return
+            #Fall back to a unique prefix match
+            matches = self.bookmarks.complete(name_lower)
+            if len(matches) != 1:
+                hint = f"\nDid you mean: {', '.join(matches)}" if matches else "\nUse `!bookmarks` to see available bookmarks."
+                await ctx.send(f"Bookmark not found: **{name}**{hint}")
+                return
+            name = name_lower = matches[0]
         
-        url = self.bookmarks[name_lower]
+        url = self.bookmarks.get(name_lower)
         async with ctx.typing():
             try:
-                await asyncio.to_thread(self.driver.get, url)
-                title = await asyncio.to_thread(lambda: self.driver.title)
-                await ctx.send(f"Opened bookmark: **{name}**\nPage title: {title}")
+                page = await self._open(await self._tab(ctx), url)
+                await ctx.send(f"Opened bookmark: **{name}**\nPage title: {page['title']}")
             except Exception as e:
                 await ctx.send(f"Error navigating to bookmark: {str(e)}")
+                await self._check_driver()
+
+    #Tabs
+    @commands.command(name="tabs")
+    async def list_tabs(self, ctx):
+        """List open tabs and who is using them
+
+        Usage: !tabs
+        """
+        if not self.driver:
+            await ctx.send("Firefox is not running!")
+            return
+
+        owner, _ = self._owner(ctx)
+        mine = self.tabs.leases.get(owner)
+        now = time.monotonic()
+        lines = [f"Tabs ({len(self.tabs)}/{self.tabs.max_tabs}):"]
+        for number, tab in enumerate(self.tabs.numbered(), start=1):
+            title = tab.title or tab.url or "New tab"
+            title = title if len(title) <= 60 else title[:57] + "..."
+            owners = ", ".join(self.tabs.owners(tab.handle)) or "free"
+            marker = " ← yours" if tab.handle == mine else ""
+            state = "loading" if tab.busy else f"idle {now - tab.last_used:.0f}s"
+            lines.append(f"**{number}.** {title} - {owners} ({state}){marker}")
+        await ctx.send("\n".join(lines)[:1900])
+
+    @commands.command(name="tab")
+    async def switch_tab(self, ctx, which: str):
+        """Switch to another tab, or open a new one for yourself
+
+        Usage: !tab <number|new>
+        """
+        if not self.driver:
+            await ctx.send("Firefox is not running! Use `!start` first.")
+            return
+
+        owner, label = self._owner(ctx)
+        try:
+            if which.lower() == "new":
+                async with self.tab_lock:
+                    if self.tabs.full:
+                        await ctx.send(f"Already at the {self.tabs.max_tabs} tab limit, use `!tab <number>` or `!tabclose`")
+                        return
+                    tab = self.tabs.add(await self.driver_ops.run("new_tab", self._new_tab))
+            else:
+                tabs = self.tabs.numbered()
+                if not which.isdigit() or not 1 <= int(which) <= len(tabs):
+                    await ctx.send(f"No tab {which}, there are {len(tabs)}. Use `!tabs` to list them.")
+                    return
+                tab = tabs[int(which) - 1]
+                #Bring it to the front so it's the one on screen
+                await self._on_tab(tab, "switch_tab", lambda: None)
+
+            self.tabs.assign(owner, tab, label)
+            number = self.tabs.numbered().index(tab) + 1
+            await ctx.send(f"Now using tab {number}: {tab.title or tab.url or 'New tab'}")
+        except Exception as e:
+            await ctx.send(f"Error switching tab: {str(e)}")
+            await self._check_driver()
+
+    @commands.command(name="tabclose", aliases=["closetab"])
+    async def close_tab(self, ctx, number: int = None):
+        """Close your tab, or a tab by number
+
+        Usage: !tabclose [number]
+        """
+        if not self.driver:
+            await ctx.send("Firefox is not running!")
+            return
+
+        if number is None:
+            tab = self.tabs.tab_for(self._owner(ctx)[0])
+            if tab is None:
+                await ctx.send("You don't have a tab open!")
+                return
+        else:
+            tabs = self.tabs.numbered()
+            if not 1 <= number <= len(tabs):
+                await ctx.send(f"No tab {number}, there are {len(tabs)}. Use `!tabs` to list them.")
+                return
+            tab = tabs[number - 1]
+
+        if tab.busy:
+            await ctx.send("That tab is still loading, try again in a moment")
+            return
+
+        try:
+            async with self.tab_lock:
+                closed = await self._close(tab)
+            await ctx.send("Tab closed" if closed else "Can't close the last tab, use `!ffstop` instead")
+        except Exception as e:
+            await ctx.send(f"Error closing tab: {str(e)}")
+            await self._check_driver()
+
+    @commands.command(name="ffmem")
+    async def memory_status(self, ctx, action: str = None):
+        """Show Firefox memory use and recent recycles, or recycle it now
+
+        Usage: !ffmem [recycle]
+        """
+        if action and action.lower() == "recycle":
+            if not self.driver:
+                await ctx.send("Firefox is not running!")
+                return
+            async with ctx.typing():
+                try:
+                    event = await self._recycle("requested")
+                    if event is None:
+                        await ctx.send("Firefox was stopped before it could be recycled")
+                        return
+                    await ctx.send(
+                        f"Firefox recycled: {event['before'] / 2**20:.0f}MB -> {event['after'] / 2**20:.0f}MB, "
+                        f"{event['tabs']} tab(s) restored in {event['seconds']:.1f}s"
+                    )
+                except Exception as e:
+                    await ctx.send(f"Error recycling Firefox: {str(e)}")
+                    await self._check_driver()
+            return
+
+        limit = f"{self.mem_limit / 2**20:.0f}MB" if self.mem_limit else "none"
+        age_limit = f"{self.max_age / 3600:g}h" if self.max_age else "none"
+        lines = []
+        if self.driver:
+            try:
+                await self._sample_memory()
+            except Exception as e:
+                lines.append(f"Couldn't sample memory: {e}")
+        if self.driver and self.mem_samples:
+            _, rss, procs = self.mem_samples[-1]
+            history = [sample[1] for sample in self.mem_samples]
+            age = (time.monotonic() - self.driver_started) / 3600
+            lines.append(f"Firefox: **{rss / 2**20:.0f}MB** across {procs} processes, up {age:.1f}h (limits: {limit}, {age_limit})")
+            lines.append(f"Last {len(history)} samples: min {min(history) / 2**20:.0f}MB, max {max(history) / 2**20:.0f}MB")
+            if self.recycle_reason:
+                lines.append(f"Recycle pending ({self.recycle_reason}), waiting for {self.recycle_idle:.0f}s without activity")
+        elif not self.driver:
+            lines.append(f"Firefox is not running (limits: {limit}, {age_limit})")
+
+        if self.recycles:
+            lines.append("Recent recycles:")
+            for event in reversed(self.recycles):
+                lines.append(
+                    f"- <t:{int(event['when'])}:R>: {event['reason']}, {event['before'] / 2**20:.0f}MB -> {event['after'] / 2**20:.0f}MB, "
+                    f"{event['tabs']} tab(s) restored in {event['seconds']:.1f}s"
+                )
+        await ctx.send("\n".join(lines)[:1900])
+
+    @commands.command(name="ffmodes")
+    async def mode_comparison(self, ctx):
+        """Compare launch time, page load time and memory between launch modes"""
+        lines = ["```", f"{'mode':<6}{'launch':>9}{'loads':>7}{'load p50':>10}{'load p95':>10}{'rss p50':>10}{'rss max':>10}"]
+        for mode, stats in self.mode_stats.items():
+            summary = stats.summary()
+            lines.append(
+                f"{mode:<6}{summary['launch_p50'] / 1000:>8.1f}s{summary['loads']:>7}"
+                f"{summary['load_p50']:>8.0f}ms{summary['load_p95']:>8.0f}ms"
+                f"{summary['rss_p50'] / 2**20:>8.0f}MB{summary['rss_max'] / 2**20:>8.0f}MB"
+            )
+        lines.append("```")
+        current = f"Running in **{self.mode}** mode" if self.driver else "Firefox is not running"
+        await ctx.send(current + "\n" + "\n".join(lines))
+
+    @commands.command(name="fflatency")
+    async def driver_latency(self, ctx):
+        """Show per-operation WebDriver latency"""
+        if not self.driver_ops.stats:
+            await ctx.send("No driver operations recorded yet!")
+            return
+
+        lines = ["```", f"{'op':<16}{'count':>6}{'avg wait':>10}{'avg run':>10}{'max':>9}"]
+        for op, stats in sorted(self.driver_ops.stats.items()):
+            lines.append(
+                f"{op:<16}{stats.count:>6}{stats.wait_ms / stats.count:>8.0f}ms"
+                f"{stats.run_ms / stats.count:>8.0f}ms{stats.max_ms:>7.0f}ms"
+            )
+        lines.append("```")
+        await ctx.send("\n".join(lines))
+
+    @commands.command(name="ffperf")
+    async def navigation_perf(self, ctx, domain: str = None):
+        """Show p50/p95 navigation timings per phase, overall or for one domain
+
+        Usage: !ffperf [domain]
+        """
+        if not self.navperf.domains:
+            await ctx.send("No navigations recorded yet!")
+            return
+
+        if domain:
+            domain = self.navperf.domain(domain if "://" in domain else "https://" + domain)
+            if domain not in self.navperf.domains:
+                await ctx.send(f"No navigations recorded for **{domain}**")
+                return
+
+        lines = [f"Navigation timings for {domain or 'all domains'}:", "```", f"{'phase':<20}{'p50':>9}{'p95':>9}{'n':>6}"]
+        for phase, (p50, p95, count) in self.navperf.summary(domain).items():
+            if count:
+                lines.append(f"{phase:<20}{p50:>7.0f}ms{p95:>7.0f}ms{count:>6}")
+        lines.append("```")
+        if not domain:
+            busiest = ", ".join(f"{name} ({count})" for name, count in self.navperf.busiest())
+            lines.append(f"Domains: {busiest}")
+        await ctx.send("\n".join(lines)[:1900])
 
 async def setup(bot):
     await bot.add_cog(FirefoxController(bot))
@@ -1,16 +1,85 @@
-import pyautogui, asyncio
+import pyautogui, pyperclip, asyncio, math, os, threading, time
 from discord.ext import commands
 
+TYPE_STRATEGIES = ["auto", "perkey", "burst", "paste"]
+TYPE_CHUNK = 20 #Characters typed between cancel checks/progress updates
+
+class TypingJob:
+    """A !type request; tracks progress and can be cancelled from the event loop"""
+
+    def __init__(self, text, strategy):
+        self.text = text
+        self.strategy = strategy
+        self.typed = 0
+        self.cancelled = threading.Event()
+
 class KeyboardCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.type_strategy = os.getenv("TYPE_STRATEGY", "auto").lower()
+        if self.type_strategy not in TYPE_STRATEGIES:
+            print(f"Unknown TYPE_STRATEGY '{self.type_strategy}', falling back to auto")
+            self.type_strategy = "auto"
+        self.burst_threshold = int(os.getenv("TYPE_BURST_THRESHOLD", 40))
+        self.paste_threshold = int(os.getenv("TYPE_PASTE_THRESHOLD", 200))
+        self.progress_threshold = int(os.getenv("TYPE_PROGRESS_THRESHOLD", 100))
+        self.typing_jobs = set() # running + queued, so !typestop can reach them
+        #Holds block the shared input thread, so they get the same ceiling as a whole macro
+        self.max_hold = float(os.getenv("MACRO_MAX_SECONDS", 30))
+
+    def _pick_strategy(self, text):
+        if self.type_strategy != "auto":
+            return self.type_strategy
+        #typewrite can only produce plain ASCII keys, anything else has to go through the clipboard
+        if not text.isascii() or len(text) >= self.paste_threshold:
+            return "paste"
+        if len(text) >= self.burst_threshold:
+            return "burst"
+        return "perkey"
+
+    @staticmethod
+    def _type(job):
+        """Type out a TypingJob with its strategy - runs on the input worker"""
+        if job.cancelled.is_set():
+            return
 
+        if job.strategy == "paste":
+            previous = pyperclip.paste()
+            pyperclip.copy(job.text)
+            pyautogui.hotkey("ctrl", "v")
+            #Give the target app a moment to read the clipboard before we put the old contents back
+            time.sleep(0.1)
+            pyperclip.copy(previous)
+            job.typed = len(job.text)
+            return
+
+        interval = 0.05 if job.strategy == "perkey" else 0
+        for i in range(0, len(job.text), TYPE_CHUNK):
+            if job.cancelled.is_set():
+                return
+            chunk = job.text[i:i + TYPE_CHUNK]
+            pyautogui.typewrite(chunk, interval=interval)
+            job.typed = i + len(chunk)
+
+    async def _report_progress(self, message, job):
+        while True:
+            await asyncio.sleep(1)
+            await message.edit(content=f"Typing ({job.strategy})... {job.typed}/{len(job.text)} characters")
+
+    @staticmethod
+    def _hold(key, duration):
+        """Hold a key down for duration seconds - runs on the input worker"""
+        pyautogui.keyDown(key)
+        try:
+            time.sleep(duration)
+        finally:
+            pyautogui.keyUp(key)
 
     @commands.command(name="key")
     async def press_key(self, ctx, key: str):
         """Press a single key on the keyboard. Usage: !key <key>"""
         try:
-            pyautogui.press(key)
+            await self.bot.input_worker.run(pyautogui.press, key)
             await ctx.send(f"Pressed key: `{key}`")
         except Exception as e:
             await ctx.send(f"Error pressing key: {e}")
@@ -18,17 +87,59 @@ class KeyboardCommands(commands.Cog):
     @commands.command(name="type")
     async def type_text(self, ctx, *, text: str):
         """Type a string of text. Usage: !type <text>"""
+        job = TypingJob(text, self._pick_strategy(text))
+        self.typing_jobs.add(job)
+        progress = None
         try:
-            pyautogui.typewrite(text, interval=0.05)
-            await ctx.send(f"Typed: `{text}`")
+            #Long jobs get a message that's kept up to date while they type
+            if job.strategy != "paste" and len(text) >= self.progress_threshold:
+                message = await ctx.send(f"Typing ({job.strategy})... 0/{len(text)} characters")
+                progress = asyncio.create_task(self._report_progress(message, job))
+
+            await self.bot.input_worker.run(self._type, job)
+
+            display = text if len(text) <= 1800 else text[:1800] + "..."
+            if job.cancelled.is_set():
+                await ctx.send(f"Typing cancelled after {job.typed}/{len(text)} characters")
+            else:
+                await ctx.send(f"Typed ({job.strategy}): `{display}`")
         except Exception as e:
             await ctx.send(f"Error typing text: {e}")
+        finally:
+            self.typing_jobs.discard(job)
+            if progress:
+                progress.cancel()
+
+    @commands.command(name="typestop", aliases=["stoptype"])
+    async def stop_typing(self, ctx):
+        """Cancel any !type that is still running or waiting. Usage: !typestop"""
+        if not self.typing_jobs:
+            await ctx.send("Nothing is being typed!")
+            return
+        for job in self.typing_jobs:
+            job.cancelled.set()
+        await ctx.send(f"Cancelling {len(self.typing_jobs)} typing job(s)")
+
+    @commands.command(name="typemode")
+    async def type_mode(self, ctx, mode: str = None):
+        """Show or set how !type enters text. Usage: !typemode <auto|perkey|burst|paste>"""
+        if mode is None:
+            await ctx.send(f"Typing mode: `{self.type_strategy}`")
+            return
+
+        mode = mode.lower()
+        if mode not in TYPE_STRATEGIES:
+            await ctx.send(f"Unknown typing mode `{mode}`. Options: {', '.join(TYPE_STRATEGIES)}")
+            return
+
+        self.type_strategy = mode
+        await ctx.send(f"Typing mode set to `{mode}`")
 
     @commands.command(name="hotkey")
     async def press_hotkey(self, ctx, *keys):
         """Press a hotkey combination. Usage: !hotkey ctrl c"""
         try:
-            pyautogui.hotkey(*keys)
+            await self.bot.input_worker.run(pyautogui.hotkey, *keys)
             await ctx.send(f"Pressed hotkey: `{' + '.join(keys)}`")
         except Exception as e:
             await ctx.send(f"Error pressing hotkey: {e}")
@@ -36,10 +147,11 @@ class KeyboardCommands(commands.Cog):
     @commands.command(name="hold")
     async def hold_key(self, ctx, key: str, duration: float = 0.5):
         """Hold a key for a duration. Usage: !hold <key> <seconds>"""
+        if not math.isfinite(duration) or not 0 <= duration <= self.max_hold:
+            await ctx.send(f"Hold duration must be between 0 and {self.max_hold:g} seconds")
+            return
         try:
-            pyautogui.keyDown(key)
-            await asyncio.sleep(duration)
-            pyautogui.keyUp(key)
+            await self.bot.input_worker.run(self._hold, key, duration)
             await ctx.send(f"Held key `{key}` for {duration} seconds")
         except Exception as e:
             await ctx.send(f"Error holding key: {e}")
@@ -50,6 +162,17 @@ class KeyboardCommands(commands.Cog):
         common_keys = f"The List of available keys can be found here: https://pyautogui.readthedocs.io/en/latest/keyboard.html#keyboard-keys"
         await ctx.send(common_keys)
 
+    @commands.command(name="inputqueue", aliases=["iq"])
+    async def input_queue(self, ctx):
+        """Show how backed up the keyboard/mouse input queue is. Usage: !inputqueue"""
+        worker = self.bot.input_worker
+        await ctx.send(
+            f"Input queue: {worker.depth}/{worker.max_queue} waiting "
+            f"(oldest {worker.oldest_wait():.2f}s)\n"
+            f"Completed: {worker.completed} | Last wait: {worker.last_wait:.2f}s | "
+            f"Avg wait: {worker.avg_wait:.2f}s | Max wait: {worker.max_wait:.2f}s"
+        )
+
 
 async def setup(bot):
     await bot.add_cog(KeyboardCommands(bot))
@@ -0,0 +1,277 @@
+import pyautogui, math, os, re, time
+from discord.ext import commands
+from cogs.mouse import direction_offset, SCROLL_INCREMENT
+from utils.json_store import JsonStore
+
+TYPE_INTERVAL = 0.05
+NAME_PATTERN = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+class MacroError(Exception):
+    """Raised when a sequence doesn't parse or validate"""
+    pass
+
+def precise_sleep(until):
+    """Sleep until perf_counter() reaches until, spinning for the last couple of ms
+
+    time.sleep alone overshoots by up to ~15ms on Windows, which adds up over a macro.
+    """
+    while True:
+        remaining = until - time.perf_counter()
+        if remaining <= 0:
+            return
+        if remaining > 0.002:
+            time.sleep(remaining - 0.002)
+
+class Step:
+    """One compiled action: the pyautogui call to make, and how long it should take"""
+
+    def __init__(self, text, action, duration=0.0, hold=None):
+        self.text = text
+        self.action = action
+        self.duration = duration
+        #(key, seconds) for steps that hold a key; released on a precise deadline rather than in action
+        self.hold = hold
+
+    def run(self):
+        start = time.perf_counter()
+        if self.hold:
+            key, seconds = self.hold
+            pyautogui.keyDown(key)
+            try:
+                precise_sleep(start + seconds)
+            finally:
+                pyautogui.keyUp(key)
+        elif self.action:
+            self.action()
+        #Fixed length steps (moves with a duration, waits) always take exactly that long
+        precise_sleep(start + self.duration)
+
+def _number(value, step, what):
+    try:
+        number = float(value)
+    except ValueError:
+        raise MacroError(f"Step {step}: `{value}` isn't a valid {what}")
+    #nan and inf parse fine but would spin precise_sleep forever or blow up int()
+    if not math.isfinite(number):
+        raise MacroError(f"Step {step}: `{value}` isn't a valid {what}")
+    if number < 0:
+        raise MacroError(f"Step {step}: {what} can't be negative")
+    return number
+
+def _integer(value, step, what):
+    return int(_number(value, step, what))
+
+def _key(value, step):
+    key = value.lower()
+    if key not in pyautogui.KEYBOARD_KEYS:
+        raise MacroError(f"Step {step}: unknown key `{value}` (see `!keys`)")
+    return key
+
+def _compile_step(text, step):
+    parts = text.split()
+    verb, args = parts[0].lower(), parts[1:]
+
+    if verb == "key":
+        if len(args) not in (1, 2):
+            raise MacroError(f"Step {step}: usage `key <key> [seconds]`")
+        key = _key(args[0], step)
+        if len(args) == 2:
+            seconds = _number(args[1], step, "duration")
+            return Step(text, None, seconds, hold=(key, seconds))
+        return Step(text, lambda: pyautogui.press(key))
+
+    if verb == "hold":
+        if len(args) != 2:
+            raise MacroError(f"Step {step}: usage `hold <key> <seconds>`")
+        key = _key(args[0], step)
+        seconds = _number(args[1], step, "duration")
+        return Step(text, None, seconds, hold=(key, seconds))
+
+    if verb == "hotkey":
+        if not args:
+            raise MacroError(f"Step {step}: usage `hotkey <key> <key> ...`")
+        keys = [_key(arg, step) for arg in args]
+        return Step(text, lambda: pyautogui.hotkey(*keys))
+
+    if verb == "type":
+        #Keep the original spacing/case of whatever follows "type"
+        typed = text.strip()[len(parts[0]):].strip()
+        if not typed:
+            raise MacroError(f"Step {step}: usage `type <text>`")
+        return Step(text, lambda: pyautogui.typewrite(typed, interval=TYPE_INTERVAL), len(typed) * TYPE_INTERVAL)
+
+    if verb == "mouse":
+        if len(args) not in (2, 3):
+            raise MacroError(f"Step {step}: usage `mouse <direction> <amount> [seconds]`")
+        if not any(d in args[0].lower() for d in ("up", "down", "left", "right")):
+            raise MacroError(f"Step {step}: unknown direction `{args[0]}`")
+        amount = _integer(args[1], step, "amount")
+        seconds = _number(args[2], step, "duration") if len(args) == 3 else 0.0
+        x, y = direction_offset(args[0], amount)
+        return Step(text, lambda: pyautogui.move(x, y, seconds), seconds)
+
+    if verb == "moveto":
+        if len(args) not in (2, 3):
+            raise MacroError(f"Step {step}: usage `moveto <x> <y> [seconds]`")
+        x, y = _integer(args[0], step, "x"), _integer(args[1], step, "y")
+        seconds = _number(args[2], step, "duration") if len(args) == 3 else 0.0
+        return Step(text, lambda: pyautogui.moveTo(x, y, seconds), seconds)
+
+    if verb == "click":
+        btn = args[0].lower() if args else "left"
+        if btn not in ("left", "middle", "right"):
+            raise MacroError(f"Step {step}: unknown mouse button `{btn}`")
+        clicks = 1
+        if len(args) > 1:
+            if not args[1].isdigit() or int(args[1]) < 1:
+                raise MacroError(f"Step {step}: click count must be a whole number, at least 1")
+            clicks = int(args[1])
+        return Step(text, lambda: pyautogui.click(button=btn, clicks=clicks, interval=0.05), (clicks - 1) * 0.05)
+
+    if verb == "scroll":
+        if len(args) != 2 or args[0].lower() not in ("up", "down"):
+            raise MacroError(f"Step {step}: usage `scroll <up|down> <amount>`")
+        amount = _integer(args[1], step, "amount") * SCROLL_INCREMENT
+        if args[0].lower() == "down":
+            amount = -amount
+        return Step(text, lambda: pyautogui.scroll(amount))
+
+    if verb == "wait":
+        if len(args) != 1:
+            raise MacroError(f"Step {step}: usage `wait <seconds>`")
+        return Step(text, None, _number(args[0], step, "duration"))
+
+    raise MacroError(f"Step {step}: unknown action `{verb}`")
+
+def compile_macro(source: str, max_steps=50, max_seconds=30.0):
+    """Parse and validate a `;` separated sequence into steps, all up front"""
+    texts = [part.strip() for part in source.split(";") if part.strip()]
+    if not texts:
+        raise MacroError("Empty sequence")
+    if len(texts) > max_steps:
+        raise MacroError(f"Too many steps ({len(texts)}, max {max_steps})")
+
+    steps = [_compile_step(text, i) for i, text in enumerate(texts, start=1)]
+    total = sum(step.duration for step in steps)
+    if total > max_seconds:
+        raise MacroError(f"Sequence would take {total:.1f}s (max {max_seconds:.0f}s)")
+    return steps
+
+def run_steps(steps):
+    """Run compiled steps back to back - runs on the input worker. Returns seconds taken"""
+    #pyautogui sleeps PAUSE seconds after every call, which would throw off the macro's own timing.
+    #Safe to change here since the input worker is the only thread driving pyautogui
+    pause = pyautogui.PAUSE
+    pyautogui.PAUSE = 0
+    try:
+        start = time.perf_counter()
+        for step in steps:
+            step.run()
+        return time.perf_counter() - start
+    finally:
+        pyautogui.PAUSE = pause
+
+class MacroCommands(commands.Cog):
+    """Run several keyboard/mouse actions from one message, and save them as named macros"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.macro_file = os.getenv("MACRO_FILE", "macros.json")
+        self.max_steps = int(os.getenv("MACRO_MAX_STEPS", 50))
+        self.max_seconds = float(os.getenv("MACRO_MAX_SECONDS", 30))
+        self.macros = {} # name -> source text
+        self.store = JsonStore(self.macro_file, "macros")
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.macro_file):
+            self.macros = self.store.read()
+            print(f"Loaded {len(self.macros)} macros")
+
+    async def _save(self):
+        await self.store.save(lambda: dict(self.macros))
+
+    async def _run(self, ctx, source, label):
+        try:
+            steps = compile_macro(source, self.max_steps, self.max_seconds)
+        except MacroError as e:
+            await ctx.send(f"ERROR: {e}")
+            return
+
+        try:
+            elapsed = await self.bot.input_worker.run(run_steps, steps)
+            summary = ", ".join(step.text for step in steps)
+            if len(summary) > 1500:
+                summary = summary[:1500] + "..."
+            await ctx.send(f"{label}: ran {len(steps)} steps in {elapsed:.2f}s\n`{summary}`")
+        except Exception as e:
+            await ctx.send(f"Error running sequence: {e}")
+
+    @commands.command(name="do")
+    async def do_sequence(self, ctx, *, sequence: str):
+        """Run a sequence of actions separated by `;`. Usage: !do key w 0.5; mouse up 2; click; type gg
+
+        Actions: key <key> [seconds], hold <key> <seconds>, hotkey <keys...>, type <text>,
+        mouse <direction> <amount> [seconds], moveto <x> <y> [seconds], click [button] [count],
+        scroll <up|down> <amount>, wait <seconds>
+        """
+        await self._run(ctx, sequence, "Sequence")
+
+    @commands.command(name="savemacro")
+    async def save_macro(self, ctx, name: str, *, sequence: str):
+        """Save a sequence under a name. Usage: !savemacro <name> <sequence>"""
+        name = name.lower()
+        if not NAME_PATTERN.match(name):
+            await ctx.send("ERROR: Macro names can only use letters, numbers, - and _ (max 32 chars)")
+            return
+
+        try:
+            steps = compile_macro(sequence, self.max_steps, self.max_seconds)
+        except MacroError as e:
+            await ctx.send(f"ERROR: {e}")
+            return
+
+        self.macros[name] = sequence
+        try:
+            await self._save()
+            await ctx.send(f"Macro saved: **{name}** ({len(steps)} steps)")
+        except Exception as e:
+            await ctx.send(f"Macro saved for this session, but failed to write it to disk: {e}")
+
+    @commands.command(name="runmacro", aliases=["play"])
+    async def run_macro(self, ctx, name: str):
+        """Run a saved macro. Usage: !runmacro <name>"""
+        source = self.macros.get(name.lower())
+        if source is None:
+            await ctx.send(f"Macro not found: **{name}**\nUse `!macros` to see saved macros.")
+            return
+        await self._run(ctx, source, f"Macro **{name.lower()}**")
+
+    @commands.command(name="macros")
+    async def list_macros(self, ctx):
+        """List saved macros"""
+        if not self.macros:
+            await ctx.send("No macros saved yet! Use `!savemacro <name> <sequence>`")
+            return
+
+        lines = []
+        for name, source in sorted(self.macros.items()):
+            display = source if len(source) <= 80 else source[:77] + "..."
+            lines.append(f"**{name}** - `{display}`")
+        await ctx.send("Saved macros:\n" + "\n".join(lines)[:1900])
+
+    @commands.command(name="delmacro", aliases=["deletemacro"])
+    async def delete_macro(self, ctx, name: str):
+        """Delete a saved macro. Usage: !delmacro <name>"""
+        if self.macros.pop(name.lower(), None) is None:
+            await ctx.send(f"Macro not found: **{name}**")
+            return
+        try:
+            await self._save()
+            await ctx.send(f"Macro removed: **{name}**")
+        except Exception as e:
+            await ctx.send(f"Error saving macros: {e}")
+
+
+async def setup(bot):
+    await bot.add_cog(MacroCommands(bot))
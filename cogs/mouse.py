@@ -1,38 +1,111 @@
-import pyautogui, os, aiohttp
+import pyautogui, os, asyncio, time
 from discord.ext import commands
-from pathlib import Path
+from utils.ingest import IngestError
+from utils.locator import Template, DEFAULT_SCALES, locate
+from utils.templates import TemplateLibrary
+
+MOVE_INCREMENT = 30 #How many pixels we move per "amount"
+SCROLL_INCREMENT = 30
+
+#Motion profiles for relative moves: seconds each (merged) move takes. None means use MOUSE_SHORT_DURATION
+MOTION_PROFILES = {
+    "instant": 0,
+    "short": None,
+    "tween": 1,
+}
+
+def direction_offset(directions: str, amount: int):
+    """Turn a direction string like "downleft" and an amount into an (x, y) pixel offset"""
+    xOffset=0
+    yOffset=0
+
+    if "up" in directions.lower():
+        yOffset += (amount * -MOVE_INCREMENT)
+    if "down" in directions.lower():
+        yOffset += (amount * MOVE_INCREMENT)
+    if "right" in directions.lower():
+        xOffset += (amount * MOVE_INCREMENT)
+    if "left" in directions.lower():
+        xOffset += (amount * -MOVE_INCREMENT)
+
+    return xOffset, yOffset
 
 class MouseCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.motion = os.getenv("MOUSE_MOTION", "short").lower()
+        if self.motion not in MOTION_PROFILES:
+            print(f"Unknown MOUSE_MOTION '{self.motion}', falling back to short")
+            self.motion = "short"
+        self.short_duration = float(os.getenv("MOUSE_SHORT_DURATION", 0.15))
+
+        #!locate search settings
+        self.locate_threshold = float(os.getenv("LOCATE_THRESHOLD", 0.8))
+        self.locate_grayscale = os.getenv("LOCATE_GRAYSCALE", "1") == "1"
+        self.locate_levels = int(os.getenv("LOCATE_PYRAMID_LEVELS", 2))
+        #How old a buffered screen frame can be and still be searched
+        self.locate_max_age = float(os.getenv("LOCATE_MAX_FRAME_AGE", 0.25))
+        scales = os.getenv("LOCATE_SCALES")
+        self.locate_scales = tuple(float(s) for s in scales.split(",")) if scales else DEFAULT_SCALES
+
+        self.templates = TemplateLibrary(os.getenv("TEMPLATE_DIR", "templates"), self.locate_scales, self.locate_levels)
+        print(f"Loaded {self.templates.load_all()} saved templates")
+
+    @property
+    def motion_duration(self):
+        duration = MOTION_PROFILES[self.motion]
+        return self.short_duration if duration is None else duration
+
+    #These run on the input worker with the net payload of every request merged into them
+    def _apply_move(self, offset):
+        x, y = offset
+        if x or y:
+            pyautogui.move(x, y, self.motion_duration)
+
+    @staticmethod
+    def _apply_scroll(amount):
+        if amount:
+            pyautogui.scroll(amount)
+
+    @staticmethod
+    def _apply_click(btn):
+        pyautogui.click(button=btn)
+
+    @staticmethod
+    def _merged(count):
+        return f" ({count} requests merged)" if count > 1 else ""
 
     @commands.command(name="mouse")
     async def move_mouse(self, ctx, directions: str, amount: int):
         """Moves the mouse a magical amount of space. Usage: !mouse downleft 10"""
         try:
-            increment=30 #How many pixels we move per "amount"
-            xOffset=0
-            yOffset=0
-
-            if "up" in directions.lower():
-                yOffset += (amount * -increment)
-            if "down" in directions.lower():
-                yOffset += (amount * increment)
-            if "right" in directions.lower():
-                xOffset += (amount * increment)
-            if "left" in directions.lower():
-                xOffset += (amount * -increment)
-
-            pyautogui.move(xOffset, yOffset, 1)
-            await ctx.send("Mouse moved")
+            offset = direction_offset(directions, amount)
+            merged = await self.bot.input_worker.run_coalesced("move", offset, self._apply_move)
+            await ctx.send(f"Mouse moved{self._merged(merged)}")
         except Exception as e:
             await ctx.send(f"Error moving mouse: {e}")
 
+    @commands.command(name="mousemode")
+    async def mouse_mode(self, ctx, mode: str = None):
+        """Show or set how relative mouse moves are animated. Usage: !mousemode <instant|short|tween>"""
+        if mode is None:
+            await ctx.send(f"Mouse motion: `{self.motion}` ({self.motion_duration}s per move)")
+            return
+
+        mode = mode.lower()
+        if mode not in MOTION_PROFILES:
+            await ctx.send(f"Unknown motion mode `{mode}`. Options: {', '.join(MOTION_PROFILES)}")
+            return
+
+        self.motion = mode
+        await ctx.send(f"Mouse motion set to `{mode}` ({self.motion_duration}s per move)")
+
     @commands.command(name="click")
     async def click(self, ctx, btn: str = "left"):
         """Clicks the mouse, optionally can do middle, or right click. Usage: !click middle"""
         try:
-            pyautogui.click(button=btn)
+            #Never merged - two clicks folded together would land as an OS double-click
+            await self.bot.input_worker.run(self._apply_click, btn)
             await ctx.send(f"{btn} mouse button clicked")
         except Exception as e:
             await ctx.send(f"Error clicking mouse: {e}")
@@ -43,68 +116,198 @@ class MouseCommands(commands.Cog):
         try:
             if direction == "down":
                 amount=-amount
-            increment=30
 
-            pyautogui.scroll(amount * increment)
-            await ctx.send(f"Mouse scrolled")
+            merged = await self.bot.input_worker.run_coalesced("scroll", amount * SCROLL_INCREMENT, self._apply_scroll)
+            await ctx.send(f"Mouse scrolled{self._merged(merged)}")
         except Exception as e:
             await ctx.send(f"Error scrolling mouse: {e}")
 
+    def _search(self, template, region=None):
+        """Grab a screen frame and run the template locator - runs off the event loop"""
+        capture = self.bot.capture
+        start = time.perf_counter()
+        frame = capture.snapshot(self.locate_max_age)
+        capture_ms = (time.perf_counter() - start) * 1000
+
+        matches, timings = locate(frame.data, template, threshold=self.locate_threshold, region=region)
+
+        if not capture.is_current(frame):
+            #The ring lapped us mid-search, redo it on a frame nothing else will overwrite
+            start = time.perf_counter()
+            frame = capture.snapshot(0)
+            capture_ms += (time.perf_counter() - start) * 1000
+            matches, timings = locate(frame.data, template, threshold=self.locate_threshold, region=region)
+
+        timings["capture"] = capture_ms
+        return matches, timings
+
+    @staticmethod
+    def _format_timings(timings):
+        phases = ["download", "decode", "template", "capture", "prepare", "match", "nms"]
+        parts = [f"{phase} {timings[phase]:.0f}ms" for phase in phases if phase in timings]
+        total = sum(timings[phase] for phase in phases if phase in timings)
+        return f"Timing: {', '.join(parts)} (total {total:.0f}ms)"
+
+    async def _move_to_match(self, ctx, matches, timings, index, btn=None):
+        """Move the mouse to the index-th (1 based) best match, optionally clicking it, and report back"""
+        if not matches:
+            await ctx.send("ERROR: Image not found on screen. Make sure the image is visible on screen\n"
+                           + self._format_timings(timings))
+            return None
+
+        if not 1 <= index <= len(matches):
+            await ctx.send(f"ERROR: Only found {len(matches)} match(es), can't pick #{index}\n"
+                           + self._format_timings(timings))
+            return None
+
+        match = matches[index - 1]
+        center_x, center_y = match.center
+        await self.bot.input_worker.run(pyautogui.moveTo, center_x, center_y, duration=self.motion_duration)
+        action = "moved to"
+        if btn:
+            await self.bot.input_worker.run(pyautogui.click, button=btn)
+            action = f"{btn} clicked"
+
+        await ctx.send(
+            f"Found {len(matches)} match(es), {action} #{index} at ({center_x}, {center_y}) "
+            f"[score {match.score:.2f}, scale {match.scale}x]\n" + self._format_timings(timings)
+        )
+        return match
+
+    @staticmethod
+    def _parse_region(region):
+        if not region:
+            return None
+        if len(region) != 4 or region[0] < 0 or region[1] < 0 or region[2] <= 0 or region[3] <= 0:
+            raise commands.BadArgument("Region must be `x y width height`")
+        return tuple(region)
+
+    async def _fetch_attachment_image(self, ctx, timings=None):
+        """Fetch the message's image attachment as an RGB array through the bot's ingest service, or None on failure"""
+
+        # Check if message has attachments
+        if not ctx.message.attachments:
+            await ctx.send("Please attach an image to your message!")
+            return None
+
+        try:
+            ingested = await self.bot.ingest.fetch_image(ctx.message.attachments[0])
+        except IngestError as e:
+            await ctx.send(f"ERROR: {e}")
+            return None
+
+        if timings is not None:
+            timings.update(ingested.timings)
+        return ingested.image
+
     @commands.command(name="locate")
-    async def locate_image(self, ctx):
+    async def locate_image(self, ctx, index: int = 1, *region: int):
         """
-        Usage: !locate (attach an image to the message)
+        Usage: !locate [match number] [x y width height] (attach an image to the message)
         The bot will download the image, search for it on your screen, and move the mouse to it.
+        Matches are numbered best first; optionally restrict the search to a region of the screen.
         """
-        
-        # Check if message has attachments
-        if not ctx.message.attachments:
-            await ctx.send("Please attach an image to your message!")
-            return
-        
-        attachment = ctx.message.attachments[0]
-        
-        # Check if attachment is an image
-        if not attachment.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
-            await ctx.send("Please attach a valid image file (PNG, JPG, JPEG, GIF, or BMP)")
+        try:
+            region = self._parse_region(region)
+        except commands.BadArgument as e:
+            await ctx.send(f"ERROR: {e}")
             return
         
         await ctx.send("Downloading image and searching screen...")
         
-        # Download the image
-        image_path = self.bot.image_dir / attachment.filename
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(attachment.url) as resp:
-                    if resp.status == 200:
-                        with open(image_path, 'wb') as f:
-                            f.write(await resp.read())
-                    else:
-                        await ctx.send("ERROR: Failed to download image")
-                        return
-            
-            # Try to locate the image on screen
-            location = pyautogui.locateOnScreen(str(image_path), confidence=0.5)
-            
-            if location is not None:
-                # Get center point of the found image
-                center_x, center_y = pyautogui.center(location)
-                
-                # Move mouse to the location
-                pyautogui.moveTo(center_x, center_y, duration=0.5)
-                
-                await ctx.send(f"Image found at coordinates: ({center_x}, {center_y})\nMouse moved to location.")
+            fetch_timings = {}
+            image = await self._fetch_attachment_image(ctx, fetch_timings)
+            if image is None:
+                return
+
+            def prepare():
+                start = time.perf_counter()
+                template = Template.from_image(image, self.locate_scales, self.locate_levels, self.locate_grayscale)
+                return template, (time.perf_counter() - start) * 1000
+
+            # Build the template and search the screen off the event loop
+            template, prepare_ms = await asyncio.to_thread(prepare)
+            matches, timings = await asyncio.to_thread(self._search, template, region)
+            timings["template"] = prepare_ms
+            timings.update(fetch_timings)
+
+            await self._move_to_match(ctx, matches, timings, index)
+
+        except Exception as e:
+            await ctx.send(f"Error: {str(e)}")
+
+    #Template library
+    @commands.command(name="savetemplate")
+    async def save_template(self, ctx, name: str):
+        """Save an attached image as a named template for !find/!clickon. Usage: !savetemplate <name>"""
+        try:
+            name = self.templates.normalize(name)
+        except ValueError as e:
+            await ctx.send(f"ERROR: {e}")
+            return
+
+        try:
+            image = await self._fetch_attachment_image(ctx)
+            if image is None:
+                return
+
+            meta = await asyncio.to_thread(self.templates.save, name, image)
+            await ctx.send(f"Template saved: **{name}** ({meta['width']}x{meta['height']}, "
+                           f"{len(meta['levels'])} scales, {meta['bytes'] / 1024:.1f} KB)")
+        except Exception as e:
+            await ctx.send(f"Error saving template: {e}")
+
+    @commands.command(name="templates")
+    async def list_templates(self, ctx):
+        """List saved templates"""
+        if not self.templates.templates:
+            await ctx.send("No templates saved yet! Use `!savetemplate <name>` with an image attached.")
+            return
+
+        lines = [
+            f"**{name}** - {meta['width']}x{meta['height']}"
+            for name, meta in sorted(self.templates.meta.items())
+        ]
+        await ctx.send("Saved templates:\n" + "\n".join(lines))
+
+    @commands.command(name="deltemplate", aliases=["deletetemplate"])
+    async def delete_template(self, ctx, name: str):
+        """Delete a saved template. Usage: !deltemplate <name>"""
+        try:
+            if await asyncio.to_thread(self.templates.delete, name.lower()):
+                await ctx.send(f"Template removed: **{name}**")
             else:
-                await ctx.send("ERROR: Image not found on screen. Make sure the image is visible on screen")
+                await ctx.send(f"Template not found: **{name}**")
+        except Exception as e:
+            await ctx.send(f"Error deleting template: {e}")
 
+    async def _locate_template(self, ctx, name, index, region, btn=None):
+        template = self.templates.get(name.lower())
+        if template is None:
+            await ctx.send(f"Template not found: **{name}**\nUse `!templates` to see saved templates.")
+            return
+
+        try:
+            matches, timings = await asyncio.to_thread(self._search, template, region)
+            await self._move_to_match(ctx, matches, timings, index, btn)
         except Exception as e:
             await ctx.send(f"Error: {str(e)}")
-        
-        finally:
-            # Clean up downloaded image
-            if image_path.exists():
-                os.remove(image_path)
+
+    @commands.command(name="find")
+    async def find_template(self, ctx, name: str, index: int = 1, *region: int):
+        """Move the mouse to a saved template. Usage: !find <name> [match number] [x y width height]"""
+        try:
+            region = self._parse_region(region)
+        except commands.BadArgument as e:
+            await ctx.send(f"ERROR: {e}")
+            return
+        await self._locate_template(ctx, name, index, region)
+
+    @commands.command(name="clickon")
+    async def click_template(self, ctx, name: str, index: int = 1, btn: str = "left"):
+        """Find a saved template on screen and click it. Usage: !clickon <name> [match number] [button]"""
+        await self._locate_template(ctx, name, index, None, btn)
 
 async def setup(bot):
     await bot.add_cog(MouseCommands(bot))
@@ -1,11 +1,16 @@
-import discord, subprocess, asyncio, os, time, pickle
+import discord, subprocess, asyncio, os, time, pickle, json, httplib2, shutil, tempfile, threading
+from collections import deque
+from datetime import datetime, timezone
 from discord.ext import commands
-import obsws_python as obs
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from pathlib import Path
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from utils.obs_ws import OBSClient, EVENTS_OUTPUTS
+from utils.record_index import RecordIndex
+from utils.drive_upload import UploadQueue
+from utils.clip_retention import ClipRetention
+from utils.tasks import TaskSet
 
 class OBSControl(commands.Cog):
     """A Discord cog to control OBS Studio via websocket"""
@@ -18,137 +23,396 @@ class OBSControl(commands.Cog):
         self.obs_host = obs_host
         self.obs_port = obs_port
         self.obs_password = obs_password
-        self.obs_client = None
+        self.obs_client = OBSClient(obs_host, obs_port, obs_password, events=EVENTS_OUTPUTS)
         self.obs_process = None
+        # OBS tells us where each replay landed; saves finish in the order they were asked for,
+        # so each event goes to the oldest !clip still waiting
+        self.replay_waiters = deque()
+        self.replay_timeout = float(os.getenv("REPLAY_SAVE_TIMEOUT", 10))
+        self.obs_client.on("ReplayBufferSaved", self._on_replay_saved)
+        # Recordings folder, kept indexed so finding the newest file doesn't mean rescanning it
+        self.record_index = RecordIndex(stable_seconds=float(os.getenv("RECORD_STABLE_SECONDS", 1)))
         self.google_folder_id = google_folder_id
         self.google_credentials_file = google_credentials_file
         self.google_token_file = google_token_file
         self.drive_service = None
-        
-        # Initialize Google Drive service if credentials provided
-        if self.google_credentials_file:
-            self._init_google_drive()
+        self.drive_error = None # why the last login attempt failed, while we keep retrying
+        self.creds = None
+        self.creds_lock = threading.Lock() # one refresh + token.pickle write at a time
+        self.drive_document = None # Drive's parsed discovery document, shared by every service we build
+        self.drive_discovery_file = os.path.join(os.path.dirname(google_token_file) or ".", "drive_v3_discovery.json")
+        self.token_refresh_margin = float(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", 300))
+        self.drive_task = None
+        self.refresh_task = None
+        # Uploads run in the background so !clip returns as soon as the file is queued
+        self.upload_queue = UploadQueue(
+            service_factory=self._upload_service,
+            journal_path=os.getenv("UPLOAD_JOURNAL", "uploads.json"),
+            concurrency=int(os.getenv("UPLOAD_CONCURRENCY", 2)),
+            chunk_size=int(os.getenv("UPLOAD_CHUNK_MB", 8)) * 2**20,
+            max_retries=int(os.getenv("UPLOAD_MAX_RETRIES", 8)),
+            on_update=self._upload_update,
+            on_done=self._upload_done,
+        )
+        self.upload_edit_interval = float(os.getenv("UPLOAD_EDIT_INTERVAL", 2)) # Discord rate limits message edits
+        self.upload_edits = {} # job id -> when its message was last edited
+        self.upload_locks = {} # job id -> lock, so a job's edits land in order
+        # Clips small enough go straight into the channel while the upload runs, bigger ones get a short preview
+        self.attach_limit = int(float(os.getenv("CLIP_ATTACH_MB", 10)) * 2**20) # 0 = never attach
+        self.preview_seconds = int(os.getenv("CLIP_PREVIEW_SECONDS", 20)) # 0 = no previews
+        self.preview_height = int(os.getenv("CLIP_PREVIEW_HEIGHT", 480))
+        self.ffmpeg = os.getenv("FFMPEG_PATH", "ffmpeg")
+        self.deliveries = {} # clip path -> task posting it, the upload waits on it before deleting the file
+        # Saved clips are kept under a disk quota and age limit, oldest clips already on Drive go first
+        self.retention = ClipRetention(
+            os.getenv("CLIP_CATALOGUE", "clips.json"),
+            quota_bytes=int(float(os.getenv("CLIP_QUOTA_GB", 20)) * 2**30),
+            max_age=float(os.getenv("CLIP_MAX_AGE_HOURS", 0)) * 3600,
+        )
+        self.keep_local = os.getenv("CLIP_KEEP_LOCAL", "false").lower() == "true" # keep uploaded clips until retention evicts them
+        self.retention_interval = float(os.getenv("CLIP_RETENTION_INTERVAL", 60))
+        self.retention_task = None
+        self.retention_runs = TaskSet() # cleanups kicked off by !clip
         
     def _init_google_drive(self):
-        """Initialize Google Drive API service using user OAuth2"""
+        """Initialize Google Drive API service using user OAuth2. Blocking, runs on a worker thread"""
         try:
-            creds = None
+            with self.creds_lock:
+                creds = self._load_creds()
             
-            # The token.pickle file stores the user's access and refresh tokens
-            if os.path.exists(self.google_token_file):
-                with open(self.google_token_file, 'rb') as token:
-                    creds = pickle.load(token)
-            
-            # If there are no (valid) credentials available, let the user log in
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    print("Refreshing Google Drive credentials...")
-                    creds.refresh(Request())
-                else:
-                    print("Starting Google Drive OAuth flow...")
-                    print("A browser window will open for you to authorize the application.")
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        self.google_credentials_file, self.SCOPES)
-                    creds = flow.run_local_server(port=0)
-                
-                # Save the credentials for the next run
-                with open(self.google_token_file, 'wb') as token:
-                    pickle.dump(creds, token)
-                print("Google Drive credentials saved!")
-            
-            self.drive_service = build('drive', 'v3', credentials=creds)
+            self.creds = creds
+            self.drive_document = self._load_drive_document()
+            self.drive_service = build_from_document(self.drive_document, credentials=creds)
+            self.drive_error = None
             print("Google Drive service initialized successfully")
             
         except Exception as e:
             print(f"Failed to initialize Google Drive: {e}")
             self.drive_service = None
+            self.drive_error = str(e)
     
-    def _upload_to_drive(self, file_path: str):
-        """Upload a file to Google Drive and return the file ID"""
-        if not self.drive_service:
-            print("Google Drive service not initialized")
-            return None
+    def _load_creds(self):
+        """Credentials from token.pickle, refreshed or logged in from scratch if need be - under creds_lock"""
+        creds = None
+        
+        # The token.pickle file stores the user's access and refresh tokens
+        if os.path.exists(self.google_token_file):
+            with open(self.google_token_file, 'rb') as token:
+                creds = pickle.load(token)
+        
+        # If there are no (valid) credentials available, let the user log in
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                print("Refreshing Google Drive credentials...")
+                creds.refresh(Request())
+            else:
+                print("Starting Google Drive OAuth flow...")
+                print("A browser window will open for you to authorize the application.")
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    self.google_credentials_file, self.SCOPES)
+                creds = flow.run_local_server(port=0)
+            
+            # Save the credentials for the next run
+            with open(self.google_token_file, 'wb') as token:
+                pickle.dump(creds, token)
+            print("Google Drive credentials saved!")
+        
+        return creds
+    
+    def _load_drive_document(self):
+        """Drive's discovery document, from our local copy if we have one so startup never has to fetch it"""
+        if os.path.exists(self.drive_discovery_file):
+            try:
+                with open(self.drive_discovery_file, "r") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Failed to read cached Drive discovery document, fetching it again: {e}")
+        
+        #The client library ships a copy, only go to the network if this version doesn't have one
+        document = discovery_cache.get_static_doc("drive", "v3")
+        if document is None:
+            resp, content = httplib2.Http(timeout=30).request("https://www.googleapis.com/discovery/v1/apis/drive/v3/rest")
+            if resp.status != 200:
+                raise RuntimeError(f"Failed to fetch Drive discovery document ({resp.status})")
+            document = content.decode("utf-8")
         
         try:
-            file_name = os.path.basename(file_path)
-            file_metadata = {
-                'name': file_name,
-            }
-            
-            # Add to specific folder if folder_id is provided
-            if self.google_folder_id:
-                file_metadata['parents'] = [self.google_folder_id]
-            
-            media = MediaFileUpload(file_path, resumable=True)
-            file = self.drive_service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id, webViewLink'
-            ).execute()
-            
-            print(f"File uploaded successfully: {file.get('webViewLink')}")
-            return file.get('id')
-            
+            with open(self.drive_discovery_file + ".tmp", "w") as f:
+                f.write(document)
+            os.replace(self.drive_discovery_file + ".tmp", self.drive_discovery_file)
         except Exception as e:
-            print(f"Failed to upload to Google Drive: {e}")
-            return None
+            print(f"Failed to cache Drive discovery document: {e}")
+        return json.loads(document)
+    
+    async def _start_drive(self):
+        """Log in to Google Drive in the background, then start uploading. Clips queued before this finishes just wait
+
+        A failed login (e.g. no network yet) is retried with backoff rather than left until the next restart.
+        """
+        delay = 30
+        while True:
+            await asyncio.to_thread(self._init_google_drive)
+            if self.drive_service:
+                break
+            print(f"Retrying Google Drive login in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 600)
+        resumed = await self.upload_queue.start()
+        if resumed:
+            print(f"Resuming {resumed} Google Drive upload(s)")
+        self.refresh_task = asyncio.create_task(self._refresh_loop())
+    
+    def _refresh_creds(self):
+        """Refresh a copy of the credentials and swap it in, so uploads in flight never see them change mid-request"""
+        with self.creds_lock:
+            creds = pickle.loads(pickle.dumps(self.creds))
+            creds.refresh(Request())
+            with open(self.google_token_file, 'wb') as token:
+                pickle.dump(creds, token)
+            self.creds = creds
+    
+    async def _refresh_loop(self):
+        """Refresh the access token token_refresh_margin seconds before it expires, so uploads never wait on it"""
+        while True:
+            delay = 600
+            if self.creds.expiry:
+                #google-auth keeps expiry as naive UTC
+                now = datetime.now(timezone.utc).replace(tzinfo=None)
+                delay = (self.creds.expiry - now).total_seconds() - self.token_refresh_margin
+            await asyncio.sleep(max(30, delay))
+            try:
+                await asyncio.to_thread(self._refresh_creds)
+                print(f"Refreshed Google Drive credentials, valid until {self.creds.expiry}")
+            except Exception as e:
+                print(f"Failed to refresh Google Drive credentials: {e}")
+    
+    def _upload_service(self):
+        """A Drive service with its own HTTP connection, for one upload - httplib2 isn't thread safe"""
+        return build_from_document(self.drive_document, credentials=self.creds)
+
+    def _queued_text(self, name, size_mb):
+        """What a queued clip is waiting on - Drive itself, if it isn't up yet"""
+        if self.drive_service:
+            return f"Replay saved as `{name}` ({size_mb:.2f} MB), queued for upload to Google Drive..."
+        if self.drive_error:
+            return (f"Replay saved as `{name}` ({size_mb:.2f} MB). Google Drive is unavailable right now ({self.drive_error}), "
+                    "it's queued and will upload once the login is retried successfully")
+        return f"Replay saved as `{name}` ({size_mb:.2f} MB), queued for upload once Google Drive has finished starting..."
+
+    def _upload_text(self, job):
+        size_mb = job.size / (1024 * 1024)
+        if job.status == "queued":
+            return self._queued_text(job.name, size_mb)
+        if job.status == "uploading":
+            return f"Uploading `{job.name}` to Google Drive: {job.progress:.0%} ({job.uploaded / (1024 * 1024):.1f}/{size_mb:.1f} MB)"
+        if job.status == "retrying":
+            return f"Uploading `{job.name}` to Google Drive: {job.progress:.0%}, retrying after an error (attempt {job.attempts})\n{job.error}"
+        if job.status == "done":
+            link = job.file.get("webViewLink", "")
+            return f"Replay saved and uploaded to Google Drive!\n{link}\n{job.meta.get('local', '')}"
+        return f"Replay saved locally as `{job.name}`\nFailed to upload to Google Drive: {job.error}"
 
-    def _get_latest_replay_file(self):
-        """Get the most recently created replay file from OBS output directory"""
+    async def _upload_done(self, job):
+        """Awaited by the upload worker once a clip is on Drive: delete the local file, once it's done being posted to the channel"""
+        delivery = self.deliveries.get(job.path)
+        if delivery:
+            await asyncio.gather(delivery, return_exceptions=True)
+        if self.keep_local:
+            await self.retention.mark_uploaded(job.path)
+            job.meta["local"] = f"Local copy kept until it's cleaned up: `{job.name}`"
+        else:
+            try:
+                await asyncio.to_thread(os.remove, job.path)
+                await self.retention.discard(job.path)
+                job.meta["local"] = f"Local file deleted: `{job.name}`"
+            except Exception as e:
+                job.meta["local"] = f"Failed to delete local file: {str(e)}"
+
+    async def _upload_update(self, job):
+        """Keep a clip's message up to date as its upload moves along, editing at most every upload_edit_interval"""
+        finished = job.status in ("done", "failed")
+        now = time.monotonic()
+        if not finished and now - self.upload_edits.get(job.id, 0) < self.upload_edit_interval:
+            return
+        self.upload_edits[job.id] = now
+
+        lock = self.upload_locks.setdefault(job.id, asyncio.Lock())
         try:
-            # Get the replay buffer file path from OBS
-            output_settings = self.obs_client.get_record_directory()
-            output_dir = output_settings.record_directory
-            
-            # Look for video files in the output directory
-            video_extensions = ['.mp4', '.mkv', '.flv', '.mov']
-            video_files = []
-            
-            for ext in video_extensions:
-                video_files.extend(Path(output_dir).glob(f'*{ext}'))
-            
-            if not video_files:
-                return None
-            
-            # Get the most recently modified file
-            latest_file = max(video_files, key=lambda x: x.stat().st_mtime)
-            
-            # Wait a moment to ensure file is fully written
-            time.sleep(1)
-            
-            return str(latest_file)
-            
+            async with lock:
+                channel = self.bot.get_channel(job.meta.get("channel_id"))
+                if channel and job.meta.get("message_id"):
+                    # Rendered from the job's current state, so a late edit can't roll the message back
+                    await channel.get_partial_message(job.meta["message_id"]).edit(content=self._upload_text(job))
         except Exception as e:
-            print(f"Error finding replay file: {e}")
-            return None
+            print(f"Failed to update upload message: {e}")
+        finally:
+            if finished:
+                self.upload_edits.pop(job.id, None)
+                self.upload_locks.pop(job.id, None)
+
+    def _attach_limit(self, ctx):
+        """Biggest clip we can attach here - ours, or the server's own limit if that's lower"""
+        if ctx.guild:
+            return min(self.attach_limit, ctx.guild.filesize_limit)
+        return self.attach_limit
+
+    async def _make_preview(self, path, max_bytes):
+        """Cut the last preview_seconds of a clip down to preview_height with ffmpeg, returns the preview's path"""
+        ffmpeg = shutil.which(self.ffmpeg)
+        if not ffmpeg:
+            raise FileNotFoundError(f"ffmpeg not found ({self.ffmpeg}), set FFMPEG_PATH")
         
-    def connect_obs(self):
-        """Connect to OBS websocket - should be run in executor"""
+        preview = os.path.join(tempfile.gettempdir(), f"preview_{os.path.splitext(os.path.basename(path))[0]}.mp4")
+        process = await asyncio.create_subprocess_exec(
+            ffmpeg, "-y", "-loglevel", "error",
+            "-sseof", f"-{self.preview_seconds}", "-i", path,
+            "-vf", f"scale=-2:{self.preview_height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+            "-c:a", "aac", "-b:a", "96k",
+            "-movflags", "+faststart",
+            "-fs", str(max_bytes - 64 * 1024), #Stop short of the limit rather than make something we can't post
+            preview,
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
         try:
-            self.obs_client = obs.ReqClient(
-                host=self.obs_host,
-                port=self.obs_port,
-                password=self.obs_password,
-                timeout=5
-            )
+            _, error = await asyncio.wait_for(process.communicate(), timeout=120)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace')[-300:]}")
+        return preview
+
+    async def _deliver_clip(self, ctx, path, size):
+        """Post the clip itself to the channel, or a preview of it if it's too big to attach"""
+        start = time.perf_counter()
+        limit = self._attach_limit(ctx)
+        name = os.path.basename(path)
+        try:
+            if size <= limit:
+                # discord.File streams it from disk, the clip is never read into memory
+                await ctx.send(file=discord.File(path, filename=name))
+                print(f"Posted {name} in {(time.perf_counter() - start) * 1000:.0f}ms")
+                return
+            if not self.preview_seconds:
+                return
+            
+            preview = await self._make_preview(path, limit)
+            try:
+                await ctx.send(
+                    f"Preview of `{name}`: last {self.preview_seconds}s at {self.preview_height}p",
+                    file=discord.File(preview, filename=f"preview_{os.path.splitext(name)[0]}.mp4"),
+                )
+                print(f"Posted preview of {name} in {(time.perf_counter() - start) * 1000:.0f}ms")
+            finally:
+                await asyncio.to_thread(os.remove, preview)
+        except Exception as e:
+            await ctx.send(f"ERROR: Failed to post clip: {str(e)}")
+        finally:
+            self.deliveries.pop(path, None)
+
+    async def _clips_in_use(self):
+        """Clips retention mustn't touch: being posted, or uploading/about to upload
+
+        Queued uploads only count while Drive is up or still on its first login attempt - if the
+        login is failing they may never go anywhere, and holding on to them is how the disk fills.
+        """
+        paths = list(self.deliveries)
+        if self.upload_queue.workers:
+            paths += [job.path for job in self.upload_queue.jobs.values()]
+        elif self.drive_task and not self.drive_task.done() and not self.drive_error:
+            # Not logged in yet, uploads from before a restart are still only in the journal
+            paths += [job.path for job in self.upload_queue.jobs.values()]
+            paths += await self.upload_queue.journaled()
+        return {os.path.normpath(path) for path in paths}
+
+    async def _enforce_retention(self):
+        try:
+            evicted = await self.retention.enforce(keep=await self._clips_in_use())
+            if evicted:
+                print(f"Cleaned up {len(evicted)} clip(s), {sum(clip.size for clip in evicted) / (1024 * 1024):.1f} MB freed")
+        except Exception as e:
+            print(f"Clip cleanup failed: {e}")
+
+    async def _retention_loop(self):
+        """Clean up on a timer too, so the age limit applies even when no new clips come in"""
+        while True:
+            await self._enforce_retention()
+            await asyncio.sleep(self.retention_interval)
+
+    def _on_replay_saved(self, event_data):
+        """ReplayBufferSaved event - hand the path to the oldest waiting save"""
+        while self.replay_waiters:
+            waiter = self.replay_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(event_data["savedReplayPath"])
+                return
+        # Nobody waiting, e.g. saved with the OBS hotkey
+        print(f"Replay saved outside the bot: {event_data.get('savedReplayPath')}")
+
+    async def _save_replay_file(self):
+        """Save the replay buffer and return the path OBS wrote it to
+
+        Falls back to the newest file in the record directory if the event doesn't arrive in time.
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        # Queued before the request goes out, so the event can't beat us to it
+        self.replay_waiters.append(waiter)
+        try:
+            await self.obs_client.request("SaveReplayBuffer")
+            return await asyncio.wait_for(waiter, self.replay_timeout)
+        except asyncio.TimeoutError:
+            print(f"No ReplayBufferSaved event after {self.replay_timeout:.0f}s, looking for the newest file instead")
+        finally:
+            if waiter in self.replay_waiters:
+                self.replay_waiters.remove(waiter)
+
+        await self._index_record_dir()
+        return self.record_index.newest()
+
+    async def _index_record_dir(self):
+        """Point the index at OBS's current recording folder, rebuilding it only if that changed"""
+        try:
+            record_dir = (await self.obs_client.request("GetRecordDirectory"))["recordDirectory"]
+            if os.path.normpath(record_dir) != self.record_index.directory:
+                await self.record_index.start(record_dir)
+        except Exception as e:
+            print(f"Failed to index the recording folder: {e}")
+
+    async def cog_load(self):
+        """Start clip cleanup, and Google Drive in the background - it picks up any uploads still going when the bot last stopped"""
+        await self.retention.load()
+        self.retention_task = asyncio.create_task(self._retention_loop())
+        if self.google_credentials_file:
+            self.drive_task = asyncio.create_task(self._start_drive())
+
+    async def cog_unload(self):
+        """Close the OBS connection when cog is unloaded"""
+        for task in (self.drive_task, self.refresh_task, self.retention_task):
+            if task:
+                task.cancel()
+        self.retention_runs.cancel()
+        self.upload_queue.stop()
+        self.record_index.stop()
+        await self.obs_client.close()
+
+    async def async_connect_obs(self):
+        """Connect to OBS websocket, returns whether we're connected"""
+        try:
+            await self.obs_client.connect()
+            await self._index_record_dir()
             return True
         except Exception as e:
             print(f"Failed to connect to OBS: {e}")
             return False
     
-    async def async_connect_obs(self):
-        """Async wrapper for connecting to OBS"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.connect_obs)
-    
-    def disconnect_obs(self):
+    async def disconnect_obs(self):
         """Disconnect from OBS websocket"""
-        if self.obs_client:
-            try:
-                self.obs_client.base_client.ws.close()
-            except:
-                pass
-            self.obs_client = None
+        try:
+            await self.obs_client.close()
+        except Exception:
+            pass
     
     @commands.command(name="obs_start")
     async def start_obs(self, ctx):
@@ -174,11 +438,19 @@ class OBSControl(commands.Cog):
                 return
                     
             
-            # Wait for OBS to start
-            await asyncio.sleep(3)
-            
-            # Try to connect (async)
-            if await self.async_connect_obs():
+            # Keep trying to connect while OBS starts up, rather than guessing how long that takes
+            connected = False
+            deadline = time.monotonic() + 15
+            while not connected and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+                try:
+                    await self.obs_client.connect()
+                    connected = True
+                except Exception:
+                    pass
+            
+            if connected:
+                await self._index_record_dir()
                 await ctx.send("OBS started and connected successfully!")
             else:
                 await ctx.send("OBS started but couldn't connect. Make sure obs-websocket is enabled.")
@@ -190,22 +462,17 @@ class OBSControl(commands.Cog):
     async def configure_replay(self, ctx, duration: int):
         """Configure replay buffer duration"""
         
-        if not self.obs_client:
+        if not self.obs_client.connected:
             if not await self.async_connect_obs():
                 await ctx.send("ERROR: Not connected to OBS. Please start OBS first.")
                 return
         
         try:
-            # Run blocking OBS call in executor
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.obs_client.set_profile_parameter(
-                    "AdvOut",
-                    "RecRBTime",
-                    str(duration)
-                )
-            )
+            await self.obs_client.request("SetProfileParameter", {
+                "parameterCategory": "AdvOut",
+                "parameterName": "RecRBTime",
+                "parameterValue": str(duration),
+            })
             
             await ctx.send(f"Replay buffer duration set to {duration} seconds!")
             
@@ -216,15 +483,13 @@ class OBSControl(commands.Cog):
     async def start_replay(self, ctx):
         """Start the replay buffer"""
         
-        if not self.obs_client:
+        if not self.obs_client.connected:
             if not await self.async_connect_obs():
                 await ctx.send("ERROR: Not connected to OBS. Please start OBS first.")
                 return
         
         try:
-            # Run blocking OBS call in executor
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self.obs_client.start_replay_buffer)
+            await self.obs_client.request("StartReplayBuffer")
             
             await ctx.send("Replay buffer started!")
             
@@ -233,66 +498,108 @@ class OBSControl(commands.Cog):
     
     @commands.command(name="obs_save_replay", aliases=["clip"])
     async def save_replay(self, ctx):
-        """Save the current replay buffer, upload to Google Drive, and delete locally"""
+        """Save the current replay buffer, post it (or a preview) here, upload to Google Drive, and delete locally"""
         
-        if not self.obs_client:
+        if not self.obs_client.connected:
             if not await self.async_connect_obs():
                 await ctx.send("ERROR: Not connected to OBS. Please start OBS first.")
                 return
         
         try:
-            # Save the replay buffer (run in executor)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self.obs_client.save_replay_buffer)
-            
-            # Give OBS time to save the file
-            await asyncio.sleep(2)
-            
-            # Find the saved replay file (run in executor)
-            replay_file = await loop.run_in_executor(None, self._get_latest_replay_file)
+            # Save the replay buffer and wait for OBS to tell us the file is written
+            replay_file = await self._save_replay_file()
             
             if not replay_file:
                 await ctx.send("Replay buffer saved, but couldn't find the file for upload.")
                 return
             
             file_name = os.path.basename(replay_file)
-            file_size_mb = os.path.getsize(replay_file) / (1024 * 1024)
-            
-            # Upload to Google Drive if configured
-            if self.drive_service:
-                upload_msg = await ctx.send(f"Uploading `{file_name}` ({file_size_mb:.2f} MB) to Google Drive...")
-                
-                # Run upload in executor to avoid blocking
-                file_id = await loop.run_in_executor(None, self._upload_to_drive, replay_file)
-                
-                if file_id:
-                    # Delete the local file after successful upload
-                    try:
-                        os.remove(replay_file)
-                        await upload_msg.edit(content=f"Replay saved and uploaded to Google Drive!\nLocal file deleted: `{file_name}`")
-                    except Exception as e:
-                        await upload_msg.edit(content=f"Replay uploaded to Google Drive!\nFailed to delete local file: {str(e)}")
-                else:
-                    await upload_msg.edit(content=f"Replay saved locally as `{file_name}`\nFailed to upload to Google Drive")
+            file_size = os.path.getsize(replay_file)
+            file_size_mb = file_size / (1024 * 1024)
+            
+            # Track it for cleanup, which may make room by evicting older clips
+            await self.retention.add(replay_file, file_size)
+            
+            # Post it to the channel alongside the upload rather than after it.
+            # Registered first so the upload can't delete the file out from under it
+            if self.attach_limit:
+                self.deliveries[replay_file] = asyncio.create_task(self._deliver_clip(ctx, replay_file, file_size))
+            
+            # Queue the upload to Google Drive if configured, the message is kept updated as it goes.
+            # Drive may still be logging in, the queue holds the clip until it's ready
+            if self.google_credentials_file:
+                upload_msg = await ctx.send(self._queued_text(file_name, file_size_mb))
+                await self.upload_queue.enqueue(
+                    replay_file,
+                    parents=[self.google_folder_id] if self.google_folder_id else None,
+                    meta={"channel_id": ctx.channel.id, "message_id": upload_msg.id},
+                )
             else:
                 await ctx.send(f"Replay buffer saved as `{file_name}`!\nGoogle Drive upload not configured.")
             
+            self.retention_runs.spawn(self._enforce_retention())
+            
         except Exception as e:
             await ctx.send(f"ERROR: Failed to save replay buffer: {str(e)}")
     
+    @commands.command(name="uploads")
+    async def list_uploads(self, ctx):
+        """Show Google Drive uploads that are queued or in progress"""
+        if self.google_credentials_file and not self.drive_service:
+            if self.drive_error:
+                await ctx.send(f"Google Drive is unavailable ({self.drive_error}), retrying the login. {len(self.upload_queue)} upload(s) waiting")
+            else:
+                await ctx.send(f"Google Drive is still starting up, {len(self.upload_queue)} upload(s) waiting")
+            return
+        if not self.upload_queue.jobs:
+            await ctx.send("No uploads in progress")
+            return
+        
+        lines = [f"Uploads ({len(self.upload_queue)}, {self.upload_queue.concurrency} at a time):"]
+        for job in self.upload_queue.jobs.values():
+            lines.append(f"`{job.name}` - {job.status} {job.progress:.0%} of {job.size / (1024 * 1024):.1f} MB")
+        await ctx.send("\n".join(lines)[:1900])
+    
+    @commands.command(name="clips")
+    async def clip_usage(self, ctx):
+        """Show how much disk saved clips are using and which go next. Usage: !clips"""
+        try:
+            retention = self.retention
+            quota = f"{retention.quota_bytes / 2**30:.1f} GB" if retention.quota_bytes else "no quota"
+            max_age = f"{retention.max_age / 3600:g}h" if retention.max_age else "no age limit"
+            lines = [
+                f"Clips: {len(retention)} using {retention.total / 2**30:.2f} GB ({quota}, {max_age})",
+                f"Already on Google Drive: {retention.uploaded_bytes / 2**30:.2f} GB",
+                f"Cleaned up since start: {retention.evicted} clip(s), {retention.freed / 2**30:.2f} GB",
+            ]
+            
+            keep = await self._clips_in_use()
+            due = {clip.path for clip in retention.plan(keep)}
+            upcoming = retention.next_up(5, keep)
+            if upcoming:
+                lines.append("Next to go:")
+                now = time.time()
+                for clip in upcoming:
+                    state = "on Drive" if clip.uploaded else "local only"
+                    when = "due now" if clip.path in due else "not due"
+                    lines.append(f"`{os.path.basename(clip.path)}` - {clip.size / (1024 * 1024):.1f} MB, {(now - clip.mtime) / 3600:.1f}h old, {state}, {when}")
+            if keep:
+                lines.append(f"{len(keep)} clip(s) uploading or being posted, kept until they're done")
+            await ctx.send("\n".join(lines)[:1900])
+        except Exception as e:
+            await ctx.send(f"ERROR: Failed to get clip usage: {str(e)}")
+    
     @commands.command(name="obs_stop_replay")
     async def stop_replay(self, ctx):
         """Stop the replay buffer"""
         
-        if not self.obs_client:
+        if not self.obs_client.connected:
             if not await self.async_connect_obs():
                 await ctx.send("ERROR: Not connected to OBS. Please start OBS first.")
                 return
         
         try:
-            # Run blocking OBS call in executor
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self.obs_client.stop_replay_buffer)
+            await self.obs_client.request("StopReplayBuffer")
             
             await ctx.send("Replay buffer stopped!")
             
@@ -303,24 +610,15 @@ class OBSControl(commands.Cog):
     async def stop_obs(self, ctx):
         """Stop OBS Studio application"""
         
-        if not self.obs_client:
-            if not await self.async_connect_obs():
-                await ctx.send("ERROR: Not connected to OBS.")
-                return
+        # obs-websocket has no request to quit OBS, so we can only stop the copy we started
+        if not self.obs_process:
+            await ctx.send("ERROR: OBS wasn't started with `!obs_start`, so it can't be stopped from here.")
+            return
         
         try:
-            # Stop OBS via websocket (run in executor)
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None,
-                lambda: self.obs_client.base_client.ws.send('{"requestType": "Quit", "requestId": "stop_obs"}')
-            )
-            
-            self.disconnect_obs()
-            
-            if self.obs_process:
-                self.obs_process.terminate()
-                self.obs_process = None
+            await self.disconnect_obs()
+            self.obs_process.terminate()
+            self.obs_process = None
             
             await ctx.send("OBS stopped successfully!")
             
@@ -331,27 +629,42 @@ class OBSControl(commands.Cog):
     async def status(self, ctx):
         """Check OBS connection status"""
         
-        if not self.obs_client:
+        if not self.obs_client.connected:
             if not await self.async_connect_obs():
                 await ctx.send("ERROR: Not connected to OBS.")
                 return
         
         try:
-            # Run blocking OBS calls in executor
-            loop = asyncio.get_event_loop()
-            version = await loop.run_in_executor(None, self.obs_client.get_version)
-            stats = await loop.run_in_executor(None, self.obs_client.get_stats)
+            # Everything in one round trip
+            version, stats, replay, record = await self.obs_client.batch(
+                ("GetVersion", None), ("GetStats", None), ("GetReplayBufferStatus", None), ("GetRecordStatus", None)
+            )
             
             embed = discord.Embed(title="OBS Status", color=discord.Color.green())
-            embed.add_field(name="OBS Version", value=version.obs_version, inline=True)
-            embed.add_field(name="WebSocket Version", value=version.obs_web_socket_version, inline=True)
-            embed.add_field(name="FPS", value=f"{stats.active_fps:.2f}", inline=True)
+            embed.add_field(name="OBS Version", value=version["obsVersion"], inline=True)
+            embed.add_field(name="WebSocket Version", value=version["obsWebSocketVersion"], inline=True)
+            embed.add_field(name="FPS", value=f"{stats['activeFps']:.2f}", inline=True)
+            embed.add_field(name="Replay Buffer", value="Active" if replay["outputActive"] else "Stopped", inline=True)
+            embed.add_field(name="Recording", value="Active" if record["outputActive"] else "Stopped", inline=True)
+            embed.add_field(name="Dropped Frames", value=f"{stats['outputSkippedFrames']}/{stats['outputTotalFrames']}", inline=True)
             
             await ctx.send(embed=embed)
             
         except Exception as e:
             await ctx.send(f"ERROR: Failed to get OBS status: {str(e)}")
 
+def _token_path(credentials_file):
+    """token.pickle lives next to the credentials file"""
+    if not credentials_file:
+        return "token.pickle"
+    directory = os.path.dirname(credentials_file)
+    path = os.path.join(directory or ".", "token.pickle")
+    #Older versions dropped the separator (./token.pickle came out as .token.pickle), keep using that login
+    legacy = directory + "token.pickle"
+    if directory and os.path.exists(legacy) and not os.path.exists(path):
+        os.replace(legacy, path)
+    return path
+
 # Setup function to add the cog to the bot
 async def setup(bot):
     # Configure these parameters based on your OBS websocket settings
@@ -361,7 +674,7 @@ async def setup(bot):
         obs_port=int(os.getenv("OBS_PORT", 4455)),
         obs_password=os.getenv("OBS_PASSWORD"),  # Set your OBS websocket password here
         google_credentials_file=os.getenv("GOOGLE_CRED_FILE"),# Path to Google service account JSON
-        google_token_file=os.path.dirname(os.getenv("GOOGLE_CRED_FILE")) + "token.pickle",
+        google_token_file=_token_path(os.getenv("GOOGLE_CRED_FILE")),
         google_folder_id=os.getenv("GOOGLE_FOLDER_ID")  # Optional: specific Google Drive folder ID to upload to
     ))
 
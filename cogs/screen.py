@@ -0,0 +1,202 @@
+import discord, asyncio, io, os, time
+import numpy as np
+from discord.ext import commands
+from PIL import Image
+from utils.imaging import encode_frame
+
+class LiveView:
+    """State and running stats for the single live view message"""
+
+    def __init__(self, message, width, interval):
+        self.message = message
+        self.width = width
+        self.interval = interval
+        self.last_seq = -1
+        self.task = None
+
+        #Exponential moving averages (ms) of each stage of the per-frame pipeline
+        self.stats = {"age": 0.0, "prepare": 0.0, "encode": 0.0, "edit": 0.0, "total": 0.0}
+        self.bytes = 0
+        self.posted = 0
+        self.skipped = 0
+
+    def record(self, **timings):
+        for stage, ms in timings.items():
+            self.stats[stage] = ms if not self.posted else self.stats[stage] * 0.8 + ms * 0.2
+
+class ScreenCommands(commands.Cog):
+    """Look at the bot's screen from Discord"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.max_width = int(os.getenv("SCREENSHOT_MAX_WIDTH", 1920))
+        self.quality = int(os.getenv("SCREENSHOT_QUALITY", 85))
+        #A buffered frame older than this is considered stale and a fresh grab is taken instead
+        self.max_frame_age = float(os.getenv("CAPTURE_MAX_AGE", 1.0))
+
+        #Live view tuning
+        self.live = None
+        self.live_format = os.getenv("LIVE_FORMAT", "JPEG").upper()
+        self.live_quality = int(os.getenv("LIVE_QUALITY", 60))
+        self.live_min_width = int(os.getenv("LIVE_MIN_WIDTH", 320))
+        self.live_max_width = int(os.getenv("LIVE_MAX_WIDTH", 960))
+        self.live_min_interval = float(os.getenv("LIVE_MIN_INTERVAL", 1.5)) #Discord rate limits message edits
+        self.live_max_interval = float(os.getenv("LIVE_MAX_INTERVAL", 10))
+        self.live_encode_budget = float(os.getenv("LIVE_ENCODE_BUDGET_MS", 120))
+
+    async def cog_unload(self):
+        """Stop the live view when cog is unloaded"""
+        if self.live and self.live.task:
+            self.live.task.cancel()
+
+    def _encode(self, image):
+        """Downscale and JPEG encode a frame - runs off the event loop"""
+        img = Image.fromarray(image)
+        if img.width > self.max_width:
+            img = img.resize((self.max_width, round(img.height * self.max_width / img.width)), Image.BILINEAR)
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=self.quality)
+        return buffer.getvalue()
+
+    @commands.command(name="screenshot", aliases=["ss"])
+    async def screenshot(self, ctx):
+        """Post a screenshot of the screen. Usage: !screenshot"""
+        try:
+            start = time.perf_counter()
+            frame = await asyncio.to_thread(self.bot.capture.snapshot, self.max_frame_age)
+            data = await asyncio.to_thread(self._encode, frame.data)
+            elapsed = (time.perf_counter() - start) * 1000
+
+            source = "buffered" if frame.seq is not None else "fresh"
+            await ctx.send(
+                f"Screenshot ({source} frame, {frame.age * 1000:.0f}ms old, ready in {elapsed:.0f}ms)",
+                file=discord.File(io.BytesIO(data), filename="screenshot.jpg"),
+            )
+        except Exception as e:
+            await ctx.send(f"Error taking screenshot: {e}")
+
+    def _shrink(self, image, width):
+        """Cheap strided downsample towards width, so only a small copy is sent to the encoder process"""
+        step = max(1, image.shape[1] // (width * 2))
+        return np.ascontiguousarray(image[::step, ::step])
+
+    def _adapt(self, live, encode_ms):
+        """Tune resolution to the encode budget, and frame rate to what the pipeline can sustain"""
+        if encode_ms > self.live_encode_budget:
+            live.width = max(self.live_min_width, int(live.width * 0.8))
+        elif encode_ms < self.live_encode_budget / 2:
+            live.width = min(self.live_max_width, int(live.width * 1.1))
+
+        #Leave headroom over one full frame's cost so edits never pile up
+        busy = (live.stats["prepare"] + live.stats["encode"] + live.stats["edit"]) / 1000
+        live.interval = min(self.live_max_interval, max(self.live_min_interval, busy * 1.5))
+
+    async def _live_loop(self, live):
+        capture = self.bot.capture
+        loop = asyncio.get_running_loop()
+        ext = "webp" if self.live_format == "WEBP" else "jpg"
+
+        while True:
+            tick = time.perf_counter()
+            try:
+                if capture.running:
+                    frame = capture.latest()
+                    changed = frame is not None and capture.changed_since(live.last_seq)
+                else:
+                    #No background capture, grab a frame ourselves every tick
+                    frame = await asyncio.to_thread(capture.snapshot)
+                    changed = True
+
+                if not changed:
+                    live.skipped += 1
+                else:
+                    start = time.perf_counter()
+                    small = await asyncio.to_thread(self._shrink, frame.data, live.width)
+                    prepare_ms = (time.perf_counter() - start) * 1000
+
+                    data, encode_ms = await loop.run_in_executor(
+                        self.bot.process_pool, encode_frame, small, live.width, self.live_format, self.live_quality
+                    )
+
+                    start = time.perf_counter()
+                    await live.message.edit(
+                        content=f"Live view ({live.width}px, every {live.interval:.1f}s) - `!live stop` to end",
+                        attachments=[discord.File(io.BytesIO(data), filename=f"live.{ext}")],
+                    )
+                    edit_ms = (time.perf_counter() - start) * 1000
+
+                    live.record(age=frame.age * 1000, prepare=prepare_ms, encode=encode_ms, edit=edit_ms,
+                                total=(time.perf_counter() - tick) * 1000)
+                    live.last_seq = frame.seq if frame.seq is not None else live.last_seq
+                    live.bytes = len(data)
+                    live.posted += 1
+                    self._adapt(live, encode_ms)
+
+            except asyncio.CancelledError:
+                raise
+            except discord.NotFound:
+                #Someone deleted the live message
+                if self.live is live:
+                    self.live = None
+                return
+            except Exception as e:
+                print(f"Live view frame failed: {e}")
+
+            await asyncio.sleep(max(0, live.interval - (time.perf_counter() - tick)))
+
+    @commands.command(name="live")
+    async def live_view(self, ctx, action: str = "stats"):
+        """Post a live, self-updating view of the screen. Usage: !live <start|stop|stats>"""
+        action = action.lower()
+
+        if action == "start":
+            if self.live:
+                self.live.task.cancel()
+            message = await ctx.send("Starting live view...")
+            self.live = LiveView(message, self.live_min_width, self.live_min_interval)
+            self.live.task = asyncio.create_task(self._live_loop(self.live))
+
+        elif action == "stop":
+            if not self.live:
+                await ctx.send("Live view isn't running!")
+                return
+            self.live.task.cancel()
+            await self.live.message.edit(content="Live view stopped")
+            self.live = None
+            await ctx.send("Live view stopped")
+
+        elif action == "stats":
+            if not self.live:
+                await ctx.send("Live view isn't running! Use `!live start`")
+                return
+            live = self.live
+            stats = live.stats
+            await ctx.send(
+                f"Live view: {live.width}px every {live.interval:.1f}s | "
+                f"{live.posted} frames posted, {live.skipped} skipped (no change) | last frame {live.bytes / 1024:.0f} KB\n"
+                f"Per frame: frame age {stats['age']:.0f}ms, downsample {stats['prepare']:.0f}ms, "
+                f"encode {stats['encode']:.0f}ms, Discord edit {stats['edit']:.0f}ms, total {stats['total']:.0f}ms"
+            )
+
+        else:
+            await ctx.send("Usage: !live <start|stop|stats>")
+
+    @commands.command(name="capture")
+    async def capture_status(self, ctx):
+        """Show screen capture buffer stats. Usage: !capture"""
+        capture = self.bot.capture
+        if not capture.running:
+            await ctx.send("Background screen capture is off (set `CAPTURE_FPS` to enable it)")
+            return
+
+        frame = capture.latest()
+        resolution = f"{frame.data.shape[1]}x{frame.data.shape[0]}" if frame else "n/a"
+        await ctx.send(
+            f"Capturing {resolution} at {capture.fps} fps into {capture.ring_size} buffers\n"
+            f"Frames: {capture.captured} ({capture.unchanged} unchanged) | "
+            f"Grab: {capture.grab_ms:.1f}ms | Diff: {capture.diff_ms:.1f}ms"
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(ScreenCommands(bot))
@@ -1,67 +1,110 @@
 import discord, os
 from dotenv import load_dotenv
 from discord.ext import commands
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from utils.input_worker import InputWorker
+from utils.ingest import AttachmentIngestor
+from utils.capture import ScreenCapture
 
-#.env 
-load_dotenv()
+class GubHub(commands.Bot):
+    async def close(self):
+        """Shut the shared services down along with the bot"""
+        await super().close()
+        self.capture.stop()
+        self.input_worker.stop()
+        await self.ingest.close()
+        #Don't hold up shutdown for a half-finished encode
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
 
-#Globals
-TOKEN = os.getenv("TOKEN")
-ALLOWED_CHANNEL_ID = int(os.getenv("ALLOWED_CHANNEL_ID"))
-ALLOWED_ROLE_NAME = os.getenv("ALLOWED_ROLE_NAME")
-IMAGE_DIR = os.getenv("IMAGE_DIR", "temp_images")
+#Everything is built in here rather than at import: on Windows every worker process re-imports this file
+def main():
+    #.env 
+    load_dotenv()
 
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
-bot.image_dir = IMAGE_DIR
+    #Globals
+    TOKEN = os.getenv("TOKEN")
+    ALLOWED_CHANNEL_ID = int(os.getenv("ALLOWED_CHANNEL_ID"))
+    ALLOWED_ROLE_NAME = os.getenv("ALLOWED_ROLE_NAME")
+    IMAGE_DIR = os.getenv("IMAGE_DIR") #Optional, only set if you want a copy of every ingested image kept on disk
+    INGEST_MAX_MB = float(os.getenv("INGEST_MAX_MB", 8))
+    INGEST_MAX_PIXELS = int(os.getenv("INGEST_MAX_PIXELS", 25_000_000))
+    INGEST_CACHE_MB = float(os.getenv("INGEST_CACHE_MB", 256))
+    CAPTURE_FPS = float(os.getenv("CAPTURE_FPS", 4))
+    CAPTURE_RING = int(os.getenv("CAPTURE_RING", 8))
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 2))
+    INPUT_QUEUE_SIZE = int(os.getenv("INPUT_QUEUE_SIZE", 50))
+    INPUT_COALESCE_WINDOW = float(os.getenv("INPUT_COALESCE_WINDOW", 0.05))
 
-#Permission Validation, runs before all commands
-@bot.before_invoke
-async def check_permissions(ctx):
-    # Check if command is in the allowed channel
-    if ctx.channel.id != ALLOWED_CHANNEL_ID:
-        raise commands.CommandInvokeError("Error: User wrong channel")
+    intents = discord.Intents.default()
+    intents.message_content = True
+    bot = GubHub(command_prefix="!", intents=intents)
+    bot.image_dir = Path(IMAGE_DIR) if IMAGE_DIR else None
+    #Shared attachment download/decode service for any image command
+    bot.ingest = AttachmentIngestor(
+        max_bytes=int(INGEST_MAX_MB * 1024 * 1024),
+        max_pixels=INGEST_MAX_PIXELS,
+        cache_bytes=int(INGEST_CACHE_MB * 1024 * 1024),
+        save_dir=bot.image_dir,
+    )
+    #Background screen sampler, screenshot/locate commands read frames from it instead of grabbing their own
+    bot.capture = ScreenCapture(fps=CAPTURE_FPS, ring_size=CAPTURE_RING)
+    #Worker processes for CPU heavy jobs (image encoding), workers only spawn on first use
+    bot.process_pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    #Single thread that every keyboard/mouse action is funneled through, shared by the input cogs
+    bot.input_worker = InputWorker(max_queue=INPUT_QUEUE_SIZE, coalesce_window=INPUT_COALESCE_WINDOW)
 
-    # Check if user has the required role
-    role = discord.utils.get(ctx.author.roles, name=ALLOWED_ROLE_NAME)
-    if role is None:
-        await ctx.send(f"You need the `{ALLOWED_ROLE_NAME}` role to use this command.")
-        raise commands.CommandInvokeError("Error: User missing role")
+    #Permission Validation, runs before all commands
+    @bot.before_invoke
+    async def check_permissions(ctx):
+        # Check if command is in the allowed channel
+        if ctx.channel.id != ALLOWED_CHANNEL_ID:
+            raise commands.CommandInvokeError("Error: User wrong channel")
 
-@bot.event
-async def on_ready():
-    print("[---- STARTUP ----]")
-    print(f"Bot is ready! Logged in as {bot.user}")
-    print(f"Restricted to channel ID: {ALLOWED_CHANNEL_ID}")
-    print(f"Restricted to role: {ALLOWED_ROLE_NAME}")
-    for cog in ["keyboard", "mouse", "firefox", "obs"]:
-        try:
-            await bot.load_extension(f"cogs.{cog}")
-            print(f"Cog:{cog} loaded successfully!")
-        except Exception as e:
-            print(f"Failed to load {cog}: {e}")
-    try:
-        os.makedirs(IMAGE_DIR, exist_ok=True)
-        print(f"Created {IMAGE_DIR} successfully")
-    except Exception as e:
-        print(f"Failed to create image dir: {e}")
-    print("[---- ------- ----]")
+        # Check if user has the required role
+        role = discord.utils.get(ctx.author.roles, name=ALLOWED_ROLE_NAME)
+        if role is None:
+            await ctx.send(f"You need the `{ALLOWED_ROLE_NAME}` role to use this command.")
+            raise commands.CommandInvokeError("Error: User missing role")
 
+    @bot.event
+    async def on_ready():
+        print("[---- STARTUP ----]")
+        print(f"Bot is ready! Logged in as {bot.user}")
+        print(f"Restricted to channel ID: {ALLOWED_CHANNEL_ID}")
+        print(f"Restricted to role: {ALLOWED_ROLE_NAME}")
+        for cog in ["keyboard", "mouse", "macros", "screen", "firefox", "obs"]:
+            try:
+                await bot.load_extension(f"cogs.{cog}")
+                print(f"Cog:{cog} loaded successfully!")
+            except Exception as e:
+                print(f"Failed to load {cog}: {e}")
+        bot.capture.start()
+        if IMAGE_DIR:
+            try:
+                os.makedirs(IMAGE_DIR, exist_ok=True)
+                print(f"Created {IMAGE_DIR} successfully")
+            except Exception as e:
+                print(f"Failed to create image dir: {e}")
+        print("[---- ------- ----]")
 
-# Error handler for check for and handle/suppress specific failures
-@bot.event
-async def on_command_error(ctx, error):
-    #Reduce noise pollutions of people spamming random ! commands for fun
-    if isinstance(error, commands.CommandNotFound):
-        return
-    #Scoping command specific errors 
-    if isinstance(error, commands.CommandInvokeError):
-        print(f"CommandInvokeError in command '{ctx.command.name}':")
-        print(f"Original exception: {error.original}")
-    else:
-        # For other types of errors, you might want to send a message to Discord
-        await ctx.send(f"An unexpected error occurred: {error}")
 
-bot.run(TOKEN)
+    # Error handler for check for and handle/suppress specific failures
+    @bot.event
+    async def on_command_error(ctx, error):
+        #Reduce noise pollutions of people spamming random ! commands for fun
+        if isinstance(error, commands.CommandNotFound):
+            return
+        #Scoping command specific errors 
+        if isinstance(error, commands.CommandInvokeError):
+            print(f"CommandInvokeError in command '{ctx.command.name}':")
+            print(f"Original exception: {error.original}")
+        else:
+            # For other types of errors, you might want to send a message to Discord
+            await ctx.send(f"An unexpected error occurred: {error}")
 
+    bot.run(TOKEN)
+
+#Worker processes re-import this file on Windows, only the real entry point should start the bot
+if __name__ == "__main__":
+    main()
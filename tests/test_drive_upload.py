@@ -0,0 +1,170 @@
+import asyncio, json, os, re, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import build_http
+from utils.drive_upload import UploadQueue
+
+CHUNK = 256 * 1024
+
+class FakeDrive(ThreadingHTTPServer):
+    """Just enough of Drive's resumable upload protocol to run UploadQueue against"""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeDriveHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/"
+        self.sessions = {} # id -> bytearray received so far
+        self.sizes = {} # id -> total size
+        self.files = {} # id -> finished bytes
+        self.fail_chunks = [] # statuses to answer the next chunk PUTs with instead of storing them
+        self.chunk_puts = [] # (session, start) of every chunk stored
+        self.lock = threading.Lock()
+
+    def open_session(self, size, data=b""):
+        with self.lock:
+            session = f"s{len(self.sessions) + 1}"
+            self.sessions[session] = bytearray(data)
+            self.sizes[session] = size
+        return f"{self.url}upload/session/{session}"
+
+class FakeDriveHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, headers=None, body=b""):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _finish(self, session):
+        drive = self.server
+        drive.files[session] = bytes(drive.sessions.pop(session))
+        body = json.dumps({"id": session, "webViewLink": f"https://drive/{session}"}).encode()
+        self._reply(200, {"Content-Type": "application/json"}, body)
+
+    def do_POST(self):
+        #Starting a resumable session
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        location = self.server.open_session(int(self.headers["X-Upload-Content-Length"]))
+        self._reply(200, {"Location": location})
+
+    def do_PUT(self):
+        drive = self.server
+        session = self.path.rsplit("/", 1)[1]
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with drive.lock:
+            if session not in drive.sessions:
+                self._reply(404)
+                return
+            received = drive.sessions[session]
+            status_query = re.fullmatch(r"bytes \*/(\d+)", self.headers["Content-Range"])
+            if not status_query:
+                if drive.fail_chunks:
+                    self._reply(drive.fail_chunks.pop(0))
+                    return
+                start = int(re.match(r"bytes (\d+)-", self.headers["Content-Range"]).group(1))
+                assert start == len(received), f"chunk at {start}, server has {len(received)}"
+                received.extend(body)
+                drive.chunk_puts.append((session, start))
+            if len(received) >= drive.sizes[session]:
+                self._finish(session)
+            elif received:
+                self._reply(308, {"Range": f"bytes=0-{len(received) - 1}"})
+            else:
+                self._reply(308)
+
+@pytest.fixture
+def drive():
+    server = FakeDrive()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(os.urandom(3 * CHUNK + 1000))
+    return path
+
+def make_queue(drive, tmp_path, **kwargs):
+    document = json.loads(discovery_cache.get_static_doc("drive", "v3"))
+    document["rootUrl"] = document["mtlsRootUrl"] = drive.url
+    return UploadQueue(
+        service_factory=lambda: build_from_document(document, http=build_http()),
+        journal_path=str(tmp_path / "uploads.json"),
+        concurrency=1, chunk_size=CHUNK, backoff_base=0.01, **kwargs,
+    )
+
+async def run_until_done(queue, job=None):
+    await queue.start()
+    try:
+        job = job or next(iter(queue.jobs.values()))
+        return await asyncio.wait_for(job.done, 10), job
+    finally:
+        queue.stop()
+
+def test_chunked_progress(drive, tmp_path, clip):
+    async def main():
+        progress = []
+        queue = make_queue(drive, tmp_path, on_update=lambda job: progress.append(job.uploaded))
+        job = await queue.enqueue(str(clip))
+        return await run_until_done(queue, job), progress
+
+    (file, job), progress = asyncio.run(main())
+    assert drive.files[file["id"]] == clip.read_bytes()
+    assert [start for _, start in drive.chunk_puts] == [0, CHUNK, 2 * CHUNK, 3 * CHUNK]
+    assert progress == sorted(progress) and {CHUNK, 2 * CHUNK, 3 * CHUNK} <= set(progress)
+    assert job.status == "done" and job.uploaded == job.size
+
+def test_retries_server_errors(drive, tmp_path, clip):
+    drive.fail_chunks = [503, 500]
+    async def main():
+        queue = make_queue(drive, tmp_path)
+        return await run_until_done(queue, await queue.enqueue(str(clip)))
+
+    file, job = asyncio.run(main())
+    assert drive.files[file["id"]] == clip.read_bytes()
+    assert job.attempts == 2
+
+def test_expired_session_starts_over(drive, tmp_path, clip):
+    write_journal(tmp_path, clip, f"{drive.url}upload/session/gone", uploaded=CHUNK)
+    file, job = asyncio.run(run_until_done(make_queue(drive, tmp_path)))
+    assert drive.files[file["id"]] == clip.read_bytes()
+    assert drive.chunk_puts[0][1] == 0
+
+def test_resumes_from_journal(drive, tmp_path, clip):
+    data = clip.read_bytes()
+    #Drive got further than the journal knew about before the restart
+    session = drive.open_session(len(data), data[:2 * CHUNK])
+    write_journal(tmp_path, clip, session, uploaded=CHUNK)
+    file, job = asyncio.run(run_until_done(make_queue(drive, tmp_path)))
+    assert drive.files[file["id"]] == data
+    assert [start for _, start in drive.chunk_puts] == [2 * CHUNK, 3 * CHUNK]
+
+def test_on_done_runs_before_the_job_leaves_the_journal(drive, tmp_path, clip):
+    seen = []
+    async def on_done(job):
+        seen.append((job.status, job.id in queue_journal(tmp_path)))
+        os.remove(job.path)
+
+    async def main():
+        queue = make_queue(drive, tmp_path, on_done=on_done)
+        return await run_until_done(queue, await queue.enqueue(str(clip)))
+
+    asyncio.run(main())
+    assert seen == [("done", True)]
+    assert not clip.exists()
+
+def write_journal(tmp_path, clip, resumable_uri, uploaded):
+    entry = {"path": str(clip), "name": clip.name, "parents": None, "meta": {},
+             "resumable_uri": resumable_uri, "uploaded": uploaded, "attempts": 0}
+    (tmp_path / "uploads.json").write_text(json.dumps({"job1": entry}))
+
+def queue_journal(tmp_path):
+    return json.loads((tmp_path / "uploads.json").read_text())
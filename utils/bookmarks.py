@@ -0,0 +1,99 @@
+import asyncio, bisect, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+class BookmarkStore:
+    """Bookmarks persisted in SQLite and served entirely from memory
+
+    Everything is read once at load into a dict (O(1) lookup by name) plus a sorted name list
+    used for prefix completion with bisect. Writes update memory straight away and are then
+    persisted by a single writer thread, so they never block the event loop and always land
+    in the order they were made.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.urls = {} # name -> url
+        self.names = [] # sorted names
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bookmarks")
+        self.conn = None # only ever touched from the writer thread
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, name):
+        return name in self.urls
+
+    def get(self, name):
+        return self.urls.get(name)
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS bookmarks (name TEXT PRIMARY KEY, url TEXT NOT NULL)")
+            self.conn.commit()
+        return self.conn
+
+    def _load(self):
+        rows = self._connect().execute("SELECT name, url FROM bookmarks").fetchall()
+        self.urls = dict(rows)
+        self.names = sorted(self.urls)
+        return len(self.urls)
+
+    async def load(self):
+        """Read every bookmark into memory. Returns how many were loaded"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.writer, self._load)
+
+    def _write(self, sql, params):
+        conn = self._connect()
+        conn.execute(sql, params)
+        conn.commit()
+
+    async def set(self, name, url):
+        if name not in self.urls:
+            bisect.insort(self.names, name)
+        self.urls[name] = url
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.writer, self._write,
+            "INSERT INTO bookmarks (name, url) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET url = excluded.url",
+            (name, url),
+        )
+
+    async def remove(self, name):
+        """Delete a bookmark, returning its url (None if it didn't exist)"""
+        url = self.urls.pop(name, None)
+        if url is None:
+            return None
+        del self.names[bisect.bisect_left(self.names, name)]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.writer, self._write, "DELETE FROM bookmarks WHERE name = ?", (name,))
+        return url
+
+    def complete(self, prefix, limit=10):
+        """Names starting with prefix, alphabetically, at most limit of them"""
+        matches = []
+        for i in range(bisect.bisect_left(self.names, prefix), len(self.names)):
+            name = self.names[i]
+            if not name.startswith(prefix) or len(matches) >= limit:
+                break
+            matches.append(name)
+        return matches
+
+    def page(self, page, per_page):
+        """(name, url) pairs for a 1 based page, and the total number of pages"""
+        pages = max(1, -(-len(self.names) // per_page))
+        if page < 1:
+            return [], pages
+        start = (page - 1) * per_page
+        return [(name, self.urls[name]) for name in self.names[start:start + per_page]], pages
+
+    def close(self):
+        def _close():
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+        self.writer.submit(_close)
+        self.writer.shutdown(wait=False)
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """Small LRU cache with optional byte budget and time-to-live
+
+    sizeof(value) is used to track max_bytes when given; entries older than ttl seconds
+    are treated as misses. Hit/miss counters are kept for status commands.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None, ttl=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof or (lambda value: 0)
+        self.entries = OrderedDict() # key -> (value, size, stored_at)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, count=True):
+        entry = self.entries.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+            self._remove(key)
+            entry = None
+
+        if entry is None:
+            if count:
+                self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        if key in self.entries:
+            self._remove(key)
+
+        size = self.sizeof(value)
+        self.entries[key] = (value, size, time.monotonic())
+        self.bytes += size
+
+        while self.entries and (len(self.entries) > self.max_entries
+                                or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self._remove(key)
+        return entry[0]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.bytes -= size
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,213 @@
+import threading, time
+import numpy as np
+from PIL import ImageGrab
+
+class Frame:
+    """A captured screen frame. data is a read-only view straight into the capture ring"""
+
+    def __init__(self, data, timestamp, seq, dirty):
+        self.data = data
+        self.timestamp = timestamp # time.monotonic() when it was grabbed
+        self.seq = seq # None for one-off grabs that aren't part of the ring
+        self.dirty = dirty # [(x, y, w, h)] that changed since the previous frame, None = everything
+
+    @property
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+def dirty_regions(previous, current, tile=64):
+    """Rectangles (x, y, w, h) of the tiles that differ between two frames
+
+    Changed tiles are found per tile row, joined into horizontal runs, and runs with the
+    same span on consecutive rows are merged, so a moving window gives one rectangle.
+    """
+    H, W = current.shape[:2]
+    channels = current.shape[2] if current.ndim == 3 else 1
+    row_bytes = W * channels
+
+    if row_bytes % 8 == 0 and (tile * channels) % 8 == 0:
+        #Fast path: compare 8 bytes at a time, tile edges still land on word boundaries
+        changed = np.not_equal(previous.reshape(H, row_bytes).view(np.uint64),
+                               current.reshape(H, row_bytes).view(np.uint64))
+        col_step = tile * channels // 8
+    else:
+        changed = np.not_equal(previous, current)
+        if changed.ndim == 3:
+            changed = changed.any(axis=2)
+        col_step = tile
+
+    rows = np.logical_or.reduceat(changed, np.arange(0, H, tile), axis=0)
+    tiles = np.logical_or.reduceat(rows, np.arange(0, changed.shape[1], col_step), axis=1)
+    if not tiles.any():
+        return []
+
+    regions = []
+    open_runs = {} # (x0, x1) -> index in regions
+    for ty in range(tiles.shape[0]):
+        row = tiles[ty]
+        #Start/stop indexes of every run of dirty tiles in this row
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.view(np.int8), [0]))))
+        runs = {}
+        for x0, x1 in zip(edges[::2], edges[1::2]):
+            if (x0, x1) in open_runs:
+                i = open_runs[(x0, x1)]
+                x, y, w, h = regions[i]
+                regions[i] = (x, y, w, min(H, (ty + 1) * tile) - y)
+            else:
+                i = len(regions)
+                regions.append((x0 * tile, ty * tile, min(W, x1 * tile) - x0 * tile, min(H, (ty + 1) * tile) - ty * tile))
+            runs[(x0, x1)] = i
+        open_runs = runs
+
+    return [tuple(int(v) for v in region) for region in regions]
+
+class ScreenCapture:
+    """Samples the screen on a background thread into a fixed ring of preallocated frames
+
+    Consumers get Frames whose data is a read-only view into the ring rather than a copy.
+    A frame stays intact until the ring wraps around to its slot (ring_size / fps seconds),
+    use is_current() to check a long-running consumer wasn't overtaken.
+    """
+
+    def __init__(self, fps=4, ring_size=8, tile=64, grab=None):
+        self.fps = fps
+        self.ring_size = ring_size
+        self.tile = tile
+        self.grab = grab or (lambda: np.asarray(ImageGrab.grab()))
+
+        self.ring = None # preallocated (ring_size, H, W, 3) buffer, made on the first grab
+        self.frames = [None] * ring_size # Frame metadata per slot
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.new_frame = threading.Condition(self.lock)
+        self.thread = None
+        self.running = False
+
+        #Stats
+        self.grab_ms = 0.0
+        self.diff_ms = 0.0
+        self.captured = 0
+        self.unchanged = 0
+
+    def start(self):
+        if self.running or self.fps <= 0:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="screen-capture", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def _allocate(self, shape):
+        self.ring = np.empty((self.ring_size,) + shape, dtype=np.uint8)
+        self.frames = [None] * self.ring_size
+
+    def _capture_once(self):
+        start = time.perf_counter()
+        image = self.grab()
+        timestamp = time.monotonic()
+        grab_ms = (time.perf_counter() - start) * 1000
+
+        if self.ring is None or self.ring.shape[1:] != image.shape:
+            #First frame, or the resolution changed
+            with self.lock:
+                self._allocate(image.shape)
+
+        slot = (self.seq + 1) % self.ring_size
+        previous = self.frames[self.seq % self.ring_size]
+
+        #Retire the slot before overwriting it, so nobody is handed a half-written frame under the old timestamp
+        with self.lock:
+            self.frames[slot] = None
+
+        start = time.perf_counter()
+        np.copyto(self.ring[slot], image)
+        if previous is None:
+            dirty = None
+        else:
+            dirty = dirty_regions(self.ring[self.seq % self.ring_size], self.ring[slot], self.tile)
+        diff_ms = (time.perf_counter() - start) * 1000
+
+        view = self.ring[slot].view()
+        view.flags.writeable = False
+
+        with self.new_frame:
+            self.seq += 1
+            self.frames[slot] = Frame(view, timestamp, self.seq, dirty)
+            self.new_frame.notify_all()
+
+        #Exponential moving averages for the status command
+        self.grab_ms = grab_ms if not self.captured else self.grab_ms * 0.9 + grab_ms * 0.1
+        self.diff_ms = diff_ms if not self.captured else self.diff_ms * 0.9 + diff_ms * 0.1
+        self.captured += 1
+        if dirty == []:
+            self.unchanged += 1
+
+    def _run(self):
+        interval = 1 / self.fps
+        next_tick = time.perf_counter()
+        while self.running:
+            try:
+                self._capture_once()
+            except Exception as e:
+                print(f"Screen capture failed: {e}")
+                time.sleep(1)
+
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                #Can't keep up, don't try to catch up in a burst
+                next_tick = time.perf_counter()
+
+    def latest(self, max_age=None):
+        """Newest frame, or None if there isn't one (or it is older than max_age seconds)"""
+        with self.lock:
+            if not self.seq:
+                return None
+            frame = self.frames[self.seq % self.ring_size]
+        if frame is None or (max_age is not None and frame.age > max_age):
+            return None
+        return frame
+
+    def frame_at(self, t):
+        """Newest frame grabbed at or before monotonic time t, if it is still in the ring"""
+        with self.lock:
+            candidates = [f for f in self.frames if f is not None and f.timestamp <= t]
+        return max(candidates, key=lambda f: f.seq, default=None)
+
+    def wait_for_frame(self, after_seq, timeout=None):
+        """Block until a frame newer than after_seq exists. Returns it, or None on timeout"""
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.seq > after_seq or not self.running, timeout):
+                return None
+            frame = self.frames[self.seq % self.ring_size]
+        return frame if frame is not None and frame.seq > after_seq else None
+
+    def changed_since(self, seq):
+        """Whether anything on screen changed in the frames after seq
+
+        If seq has already fallen out of the ring we can't tell, so assume it did.
+        """
+        with self.lock:
+            newer = [f for f in self.frames if f is not None and f.seq > seq]
+        if not newer:
+            return False
+        if min(f.seq for f in newer) != seq + 1:
+            return True
+        return any(f.dirty is None or f.dirty for f in newer)
+
+    def is_current(self, frame):
+        """True while the ring hasn't overwritten frame's slot yet"""
+        if frame.seq is None:
+            return True
+        return self.seq - frame.seq < self.ring_size - 1
+
+    def snapshot(self, max_age=None):
+        """Latest ring frame if it is fresh enough, otherwise a one-off (blocking) grab"""
+        frame = self.latest(max_age) if self.running else None
+        if frame is None:
+            frame = Frame(self.grab(), time.monotonic(), None, None)
+        return frame
@@ -0,0 +1,150 @@
+import asyncio, os, time
+from sortedcontainers import SortedKeyList
+from utils.json_store import JsonStore
+
+class Clip:
+    """One saved clip on disk"""
+
+    def __init__(self, path, size, mtime, uploaded=False):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.uploaded = uploaded
+
+    def to_catalogue(self):
+        return {"size": self.size, "mtime": self.mtime, "uploaded": self.uploaded}
+
+class ClipRetention:
+    """Clips the bot has saved, kept under a byte quota and an age limit
+
+    The catalogue is ordered by eviction priority - clips already on Drive first, then oldest first -
+    with a running byte total, so checking the quota never means walking the disk. It's kept in a
+    JSON file so clips saved before a restart are still accounted for. Deleting happens in batches
+    on a worker thread, and anything passed in keep (still uploading or being posted) is never touched.
+    """
+
+    def __init__(self, catalogue_path, quota_bytes=0, max_age=0):
+        self.catalogue_path = catalogue_path
+        self.quota_bytes = quota_bytes # 0 = no quota
+        self.max_age = max_age # seconds, 0 = no age limit
+        self.clips = {} # path -> Clip
+        self.order = SortedKeyList(key=lambda clip: (not clip.uploaded, clip.mtime))
+        self.total = 0
+        self.evicted = 0 # clips deleted since start
+        self.freed = 0 # bytes deleted since start
+        self.lock = asyncio.Lock() # one eviction pass at a time
+        self.catalogue = JsonStore(catalogue_path, "clip catalogue")
+
+    def __len__(self):
+        return len(self.clips)
+
+    @property
+    def uploaded_bytes(self):
+        return sum(clip.size for clip in self.clips.values() if clip.uploaded)
+
+    def _add(self, clip):
+        self._remove(clip.path)
+        self.clips[clip.path] = clip
+        self.order.add(clip)
+        self.total += clip.size
+
+    def _remove(self, path):
+        clip = self.clips.pop(path, None)
+        if clip:
+            self.order.remove(clip)
+            self.total -= clip.size
+        return clip
+
+    async def add(self, path, size=None, mtime=None):
+        """Start tracking a freshly saved clip"""
+        path = os.path.normpath(path)
+        if size is None or mtime is None:
+            stat = await asyncio.to_thread(os.stat, path)
+            size, mtime = stat.st_size, stat.st_mtime
+        self._add(Clip(path, size, mtime))
+        await self.save()
+
+    async def mark_uploaded(self, path):
+        """The clip is safely on Drive, so it goes to the front of the eviction queue"""
+        clip = self._remove(os.path.normpath(path))
+        if clip:
+            clip.uploaded = True
+            self._add(clip)
+            await self.save()
+
+    async def discard(self, path):
+        """Stop tracking a clip, e.g. because it was deleted after uploading"""
+        if self._remove(os.path.normpath(path)):
+            await self.save()
+
+    def plan(self, keep=()):
+        """Clips that have to go right now to get back under the quota and age limit, in eviction order"""
+        now = time.time()
+        total = self.total
+        victims = []
+        for clip in self.order:
+            over_quota = self.quota_bytes and total > self.quota_bytes
+            if not over_quota and not self.max_age:
+                break
+            if clip.path in keep:
+                continue
+            if over_quota or now - clip.mtime > self.max_age:
+                victims.append(clip)
+                total -= clip.size
+        return victims
+
+    def next_up(self, limit=5, keep=()):
+        """The next clips in line for eviction, whether or not they're due yet"""
+        upcoming = []
+        for clip in self.order:
+            if clip.path not in keep:
+                upcoming.append(clip)
+                if len(upcoming) >= limit:
+                    break
+        return upcoming
+
+    @staticmethod
+    def _missing(paths):
+        return [path for path in paths if not os.path.exists(path)]
+
+    @staticmethod
+    def _delete(paths):
+        """Delete a batch of files, returns the ones that are gone. Runs off the loop"""
+        deleted = []
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except FileNotFoundError:
+                deleted.append(path)
+            except OSError as e:
+                print(f"Failed to delete {path}: {e}")
+        return deleted
+
+    async def enforce(self, keep=()):
+        """Forget clips deleted by hand, then evict whatever is over the quota or age limit. Returns what went"""
+        async with self.lock:
+            changed = False
+            for path in await asyncio.to_thread(self._missing, list(self.clips)):
+                changed = bool(self._remove(path)) or changed
+
+            victims = self.plan(keep)
+            evicted = []
+            if victims:
+                deleted = set(await asyncio.to_thread(self._delete, [clip.path for clip in victims]))
+                for clip in victims:
+                    if clip.path in deleted and self._remove(clip.path):
+                        evicted.append(clip)
+                self.evicted += len(evicted)
+                self.freed += sum(clip.size for clip in evicted)
+                changed = True
+        if changed:
+            await self.save()
+        return evicted
+
+    async def load(self):
+        for path, entry in (await self.catalogue.load()).items():
+            self._add(Clip(path, **entry))
+
+    async def save(self):
+        await self.catalogue.save(lambda: {clip.path: clip.to_catalogue() for clip in self.clips.values()})
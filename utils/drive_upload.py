@@ -0,0 +1,248 @@
+import asyncio, httplib2, json, os, random, time, uuid
+from googleapiclient.errors import HttpError, ResumableUploadError
+from googleapiclient.http import MediaFileUpload
+from utils.json_store import JsonStore
+from utils.tasks import TaskSet
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class UploadJob:
+    """One file on its way to Drive. Everything but done/service is saved in the journal"""
+
+    def __init__(self, path, name=None, parents=None, meta=None, job_id=None, resumable_uri=None, uploaded=0, attempts=0):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self.parents = parents
+        self.meta = meta or {} # caller's own data, e.g. which message to keep updated
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.resumable_uri = resumable_uri
+        self.uploaded = uploaded
+        self.attempts = attempts
+        self.status = "queued" # queued, uploading, retrying, done, failed
+        self.error = None
+        self.file = None # Drive's {id, webViewLink} once finished
+        self.started = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def progress(self):
+        return self.uploaded / self.size if self.size else 0.0
+
+    def to_journal(self):
+        return {
+            "path": self.path, "name": self.name, "parents": self.parents, "meta": self.meta,
+            "resumable_uri": self.resumable_uri, "uploaded": self.uploaded, "attempts": self.attempts,
+        }
+
+class UploadQueue:
+    """Background Drive uploads: bounded concurrency, chunked resumable sessions, retries with backoff
+
+    Every job and its resumable session URI are kept in a JSON journal, so after a restart start()
+    picks unfinished uploads back up where Drive says they got to instead of starting over.
+    service_factory() is called once per upload (on a worker thread) and must return a Drive v3
+    service with its own HTTP connection - point it at a fake server to test without Drive.
+    on_update(job) is called on the event loop whenever a job moves along. on_done(job) is awaited
+    by the worker once a job has uploaded, before it leaves the journal - e.g. to delete the local file.
+    Only googleapiclient's public resumable attributes (resumable_uri, resumable_progress) are used,
+    where Drive got to is asked for directly rather than through the library's retry state.
+    """
+
+    def __init__(self, service_factory, journal_path, concurrency=2, chunk_size=8 * 2**20,
+                 max_retries=8, backoff_base=1.0, backoff_max=60.0, on_update=None, on_done=None):
+        self.service_factory = service_factory
+        self.journal_path = journal_path
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size # must be a multiple of 256KB
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_update = on_update
+        self.on_done = on_done
+        self.tasks = TaskSet() # running on_update coroutines
+        self.jobs = {} # id -> UploadJob, unfinished only
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.journal = JsonStore(journal_path, "upload journal")
+
+    def __len__(self):
+        return len(self.jobs)
+
+    async def start(self):
+        """Start the workers, re-queueing anything the journal says wasn't finished. Returns how many"""
+        resumed = 0
+        for job_id, entry in (await self.journal.load()).items():
+            if job_id in self.jobs:
+                continue # queued before we started
+            if not os.path.exists(entry["path"]):
+                print(f"Dropping upload of {entry['path']}, the file is gone")
+                continue
+            job = UploadJob(job_id=job_id, **entry)
+            self.jobs[job.id] = job
+            self.queue.put_nowait(job)
+            resumed += 1
+        if resumed:
+            await self._save_journal()
+
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        return resumed
+
+    def stop(self):
+        """Stop the workers. In-flight uploads stay in the journal and resume next start()"""
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+
+    async def enqueue(self, path, name=None, parents=None, meta=None):
+        """Queue a file and return its job straight away. Await job.done for Drive's {id, webViewLink}
+
+        Works before start(), the job just waits for the workers.
+        """
+        job = UploadJob(path, name, parents, meta)
+        self.jobs[job.id] = job
+        await self._save_journal()
+        self.queue.put_nowait(job)
+        self._notify(job)
+        return job
+
+    async def journaled(self):
+        """Paths of every upload in the journal, including ones from before a restart that start() hasn't picked up yet"""
+        return [entry["path"] for entry in (await self.journal.load()).values()]
+
+    async def _save_journal(self):
+        await self.journal.save(lambda: {job.id: job.to_journal() for job in self.jobs.values()})
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                result = self.on_update(job)
+                if asyncio.iscoroutine(result):
+                    self.tasks.spawn(result)
+            except Exception as e:
+                print(f"Upload update handler error: {e}")
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                job.file = await self._upload(job)
+                job.status = "done"
+                if self.on_done:
+                    #Part of finishing the job (e.g. deleting the local copy), so it's awaited right here
+                    try:
+                        await self.on_done(job)
+                    except Exception as e:
+                        print(f"Upload completion handler error for {job.name}: {e}")
+                if not job.done.done():
+                    job.done.set_result(job.file)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+                print(f"Upload of {job.name} failed: {e}")
+                if not job.done.done():
+                    job.done.set_exception(e)
+                    job.done.exception() # don't warn if nobody is awaiting it
+            self.jobs.pop(job.id, None)
+            await self._save_journal()
+            self._notify(job)
+
+    def _request(self, service, job):
+        """Build the resumable create request, continuing the job's existing session from job.uploaded if it has one"""
+        body = {"name": job.name}
+        if job.parents:
+            body["parents"] = job.parents
+        media = MediaFileUpload(job.path, chunksize=self.chunk_size, resumable=True)
+        request = service.files().create(body=body, media_body=media, fields="id, webViewLink")
+        if job.resumable_uri:
+            request.resumable_uri = job.resumable_uri
+            request.resumable_progress = job.uploaded
+        return request
+
+    @staticmethod
+    def _session_offset(request, job):
+        """Ask Drive how much of job's session it already has
+
+        Returns (bytes received, None), or (size, file) if the upload actually finished. An expired
+        session raises HttpError 404. Runs off the loop, on the request's own authorized connection.
+        """
+        resp, content = request.http.request(
+            job.resumable_uri, method="PUT", body=b"",
+            headers={"Content-Length": "0", "Content-Range": f"bytes */{job.size}"},
+        )
+        if resp.status in (200, 201):
+            return job.size, json.loads(content)
+        if resp.status == 308:
+            #"Range: bytes=0-N" once anything has arrived, no header at all before that
+            received = resp.get("range")
+            return (int(received.rsplit("-", 1)[1]) + 1 if received else 0), None
+        raise HttpError(resp, content, uri=job.resumable_uri)
+
+    def _backoff(self, attempt):
+        return min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def _upload(self, job):
+        if not os.path.exists(job.path):
+            #e.g. cleaned up to free disk space while Drive was down, retrying won't bring it back
+            raise FileNotFoundError(f"{job.name} is gone from disk")
+        job.status = "uploading"
+        job.started = time.monotonic()
+        self._notify(job)
+        service = await asyncio.to_thread(self.service_factory)
+
+        #With a session already open (resumed from the journal, or after an error), ask Drive where it got to first
+        resync = job.resumable_uri is not None
+        request = None
+        retries = 0
+        while True:
+            try:
+                if request is None:
+                    request = await asyncio.to_thread(self._request, service, job)
+                if resync:
+                    job.uploaded, response = await asyncio.to_thread(self._session_offset, request, job)
+                    if response is not None:
+                        return response
+                    request.resumable_progress = job.uploaded
+                    resync = False
+                    self._notify(job)
+                status, response = await asyncio.to_thread(request.next_chunk)
+            except (HttpError, ResumableUploadError, httplib2.HttpLib2Error, OSError) as e:
+                code = getattr(getattr(e, "resp", None), "status", None)
+                if code == 404 and job.resumable_uri:
+                    #Session expired (they last about a week) - start a fresh one
+                    print(f"Upload session for {job.name} expired, starting over")
+                    job.resumable_uri, job.uploaded = None, 0
+                    request, resync = None, False
+                    await self._save_journal()
+                    continue
+                if isinstance(e, (HttpError, ResumableUploadError)) and code not in RETRY_STATUSES:
+                    raise
+                retries += 1
+                job.attempts += 1
+                if retries > self.max_retries:
+                    raise
+                delay = self._backoff(retries - 1)
+                job.status = "retrying"
+                job.error = str(e)
+                self._notify(job)
+                await asyncio.sleep(delay)
+                job.status = "uploading"
+                #Carry on from wherever Drive says it got to, on a fresh request
+                if request is not None and request.resumable_uri:
+                    job.resumable_uri = request.resumable_uri
+                resync = job.resumable_uri is not None
+                request = None
+                continue
+
+            retries = 0
+            if request.resumable_uri and request.resumable_uri != job.resumable_uri:
+                #New session, journal it so a restart can pick it back up
+                job.resumable_uri = request.resumable_uri
+                await self._save_journal()
+            if response is not None:
+                job.uploaded = job.size
+                return response
+            if status:
+                job.uploaded = status.resumable_progress
+                self._notify(job)
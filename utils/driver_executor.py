@@ -0,0 +1,81 @@
+import asyncio, json, time
+from concurrent.futures import ThreadPoolExecutor
+
+#Common page facts for query(), as JS expressions
+PAGE_FACTS = {
+    "url": "location.href",
+    "title": "document.title",
+    "ready_state": "document.readyState",
+    "scroll_y": "window.scrollY",
+}
+
+class OpStats:
+    """Running latency totals for one kind of driver operation"""
+
+    def __init__(self):
+        self.count = 0
+        self.wait_ms = 0.0 # time spent queued behind other operations
+        self.run_ms = 0.0 # time spent actually talking to the driver
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def record(self, wait_ms, run_ms):
+        self.count += 1
+        self.wait_ms += wait_ms
+        self.run_ms += run_ms
+        self.last_ms = wait_ms + run_ms
+        self.max_ms = max(self.max_ms, self.last_ms)
+
+class DriverExecutor:
+    """Owns the single thread every WebDriver call goes through
+
+    Selenium drivers aren't safe to use from several threads at once, and asyncio.to_thread
+    hands each call to whichever pool thread is free. Funnelling everything through one thread
+    keeps calls from concurrent commands strictly ordered. Every call is timed per operation
+    name, split into queue wait and driver time.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webdriver")
+        self.stats = {} # op name -> OpStats
+        self.pending = 0
+        self.last_active = time.monotonic()
+
+    async def run(self, op, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the driver thread, recording its latency under op"""
+        result, _ = await self.run_timed(op, fn, *args, **kwargs)
+        return result
+
+    async def run_timed(self, op, fn, *args, **kwargs):
+        """Like run(), but also returns {"wait": ms, "run": ms} for this call"""
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        timing = {"wait": 0.0, "run": 0.0}
+
+        def call():
+            started = time.perf_counter()
+            timing["wait"] = (started - submitted) * 1000
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timing["run"] = (time.perf_counter() - started) * 1000
+
+        self.pending += 1
+        try:
+            result = await loop.run_in_executor(self.executor, call)
+        finally:
+            self.pending -= 1
+            self.last_active = time.monotonic()
+            self.stats.setdefault(op, OpStats()).record(timing["wait"], timing["run"])
+        return result, timing
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+def run_query(driver, expressions):
+    """Fetch several page facts in a single execute_script round trip. Runs on the driver thread
+
+    expressions maps result names to JS expressions, e.g. run_query(driver, {"url": "location.href"}).
+    """
+    body = ", ".join(f"{json.dumps(name)}: ({expr})" for name, expr in expressions.items())
+    return driver.execute_script(f"return {{{body}}};")
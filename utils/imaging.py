@@ -0,0 +1,40 @@
+"""Image encode helpers meant to run in bot.process_pool
+
+Everything here is a plain top-level function taking and returning picklable values, so it can
+be shipped to a worker process without dragging discord or the cogs along with it.
+"""
+import io, time
+from PIL import Image
+
+def encode_frame(image, width, fmt="JPEG", quality=70):
+    """Resize an RGB array to width (keeping aspect) and encode it. Returns (bytes, encode ms)"""
+    start = time.perf_counter()
+    img = Image.fromarray(image)
+    if img.width != width:
+        img = img.resize((width, max(1, round(img.height * width / img.width))), Image.BILINEAR)
+
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, quality=quality)
+    return buffer.getvalue(), (time.perf_counter() - start) * 1000
+
+def fit_to_budget(png, max_bytes, max_width, quality=80, min_quality=40):
+    """Decode a PNG screenshot, downscale it to max_width and JPEG encode it under max_bytes
+
+    Quality is stepped down first, then the image is shrunk further if that's still not enough.
+    Returns (bytes, width, quality, ms).
+    """
+    start = time.perf_counter()
+    img = Image.open(io.BytesIO(png)).convert("RGB")
+    if img.width > max_width:
+        img = img.resize((max_width, max(1, round(img.height * max_width / img.width))), Image.BILINEAR)
+
+    while True:
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=quality)
+        data = buffer.getvalue()
+        if len(data) <= max_bytes or img.width <= 64:
+            return data, img.width, quality, (time.perf_counter() - start) * 1000
+        if quality > min_quality:
+            quality = max(min_quality, quality - 15)
+        else:
+            img = img.resize((max(1, img.width * 3 // 4), max(1, img.height * 3 // 4)), Image.BILINEAR)
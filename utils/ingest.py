@@ -0,0 +1,117 @@
+import aiohttp, asyncio, hashlib, io, os, time
+import numpy as np
+from PIL import Image
+from utils.cache import LRUCache
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+CHUNK_SIZE = 64 * 1024
+
+class IngestError(Exception):
+    """Raised when an attachment can't be downloaded or decoded within the limits"""
+    pass
+
+class IngestedImage:
+    """A decoded attachment plus where the time went getting it"""
+
+    def __init__(self, image, digest, timings, cached):
+        self.image = image
+        self.digest = digest
+        self.timings = timings
+        self.cached = cached
+
+class AttachmentIngestor:
+    """Bot-wide attachment download/decode service shared by every image command
+
+    One pooled aiohttp session is reused for every download. Attachments are streamed into
+    memory and rejected as soon as they pass max_bytes, and the pixel count is checked from
+    the image header before anything is decoded. Decoded RGB arrays are cached by content
+    hash, so the same image sent twice is only decoded once. Nothing is written to disk
+    unless save_dir is set.
+    """
+
+    def __init__(self, max_bytes, max_pixels, cache_entries=32, cache_bytes=None, save_dir=None):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.save_dir = save_dir
+        self.session = None
+        self.images = LRUCache(max_entries=cache_entries, max_bytes=cache_bytes, sizeof=lambda image: image.nbytes)
+        #Attachment URL -> content hash, lets a re-used attachment skip the download entirely
+        self.digests = LRUCache(max_entries=cache_entries * 4)
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(limit=8),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    async def download(self, url, max_bytes=None):
+        """Stream url into a bytes buffer, aborting once it passes max_bytes"""
+        max_bytes = max_bytes or self.max_bytes
+        buffer = bytearray()
+
+        async with self._get_session().get(url) as resp:
+            if resp.status != 200:
+                raise IngestError(f"Failed to download attachment (HTTP {resp.status})")
+            if resp.content_length and resp.content_length > max_bytes:
+                raise IngestError(f"Attachment is too large ({resp.content_length / 1024 / 1024:.1f} MB)")
+
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise IngestError(f"Attachment is larger than {max_bytes / 1024 / 1024:.1f} MB")
+
+        return bytes(buffer)
+
+    def _decode(self, data, filename):
+        with Image.open(io.BytesIO(data)) as img:
+            #Image.open only reads the header, so this rejects decompression bombs before decoding
+            width, height = img.size
+            if width * height > self.max_pixels:
+                raise IngestError(f"Image is too large ({width}x{height} pixels)")
+            image = np.asarray(img.convert("RGB"))
+
+        #Cached arrays are shared between commands
+        image.setflags(write=False)
+
+        if self.save_dir:
+            ext = os.path.splitext(filename)[1].lower() or ".png"
+            with open(os.path.join(self.save_dir, hashlib.sha256(data).hexdigest()[:16] + ext), "wb") as f:
+                f.write(data)
+        return image
+
+    async def fetch_image(self, attachment):
+        """Download and decode a discord.Attachment image, using the cache when possible"""
+        if not attachment.filename.lower().endswith(IMAGE_EXTENSIONS):
+            raise IngestError("Please attach a valid image file (PNG, JPG, JPEG, GIF, or BMP)")
+        if attachment.size > self.max_bytes:
+            raise IngestError(f"Attachment is too large ({attachment.size / 1024 / 1024:.1f} MB)")
+
+        timings = {}
+        digest = self.digests.get(attachment.url)
+        if digest is not None:
+            image = self.images.get(digest)
+            if image is not None:
+                return IngestedImage(image, digest, timings, cached=True)
+
+        start = time.perf_counter()
+        data = await self.download(attachment.url)
+        timings["download"] = (time.perf_counter() - start) * 1000
+
+        digest = hashlib.sha256(data).hexdigest()
+        self.digests.put(attachment.url, digest)
+        image = self.images.get(digest)
+        if image is not None:
+            return IngestedImage(image, digest, timings, cached=True)
+
+        start = time.perf_counter()
+        image = await asyncio.to_thread(self._decode, data, attachment.filename)
+        timings["decode"] = (time.perf_counter() - start) * 1000
+
+        self.images.put(digest, image)
+        return IngestedImage(image, digest, timings, cached=False)
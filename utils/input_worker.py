@@ -0,0 +1,179 @@
+import asyncio, threading, time
+from collections import deque
+
+class InputQueueFull(Exception):
+    """Raised when the input queue is at capacity"""
+    pass
+
+def add_payloads(a, b):
+    """Default merge for coalesced jobs: sum numbers, or sum tuples element-wise"""
+    if isinstance(a, tuple):
+        return tuple(x + y for x, y in zip(a, b))
+    return a + b
+
+class InputJob:
+    """A single queued input action and the future waiting on it"""
+
+    def __init__(self, loop, future, fn, args, kwargs, key=None, payload=None, merge=None):
+        self.loop = loop
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        #Coalescable jobs carry a key; adjacent jobs with the same key get their payloads merged
+        self.key = key
+        self.payload = payload
+        self.merge = merge
+        self.submitted = time.perf_counter()
+
+class InputWorker:
+    """Runs keyboard/mouse actions on one dedicated thread, in the order they were submitted
+
+    pyautogui calls block (typewrite intervals, tweened moves), so they never run on the event loop.
+    Callers await run() and get the action's result back on the loop once it has finished.
+    Relative actions (moves, scrolls) can go through run_coalesced() instead, so a burst of
+    them arriving within coalesce_window seconds runs as one net action.
+    """
+
+    def __init__(self, max_queue: int = 50, coalesce_window: float = 0.05):
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.jobs = deque()
+        self.cond = threading.Condition()
+        self.running = True
+
+        #Stats
+        self.completed = 0
+        self.coalesced = 0
+        self.last_wait = 0.0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+        self.thread = threading.Thread(target=self._run, name="input-worker", daemon=True)
+        self.thread.start()
+
+    @property
+    def depth(self):
+        """Number of actions waiting to run"""
+        with self.cond:
+            return len(self.jobs)
+
+    @property
+    def avg_wait(self):
+        """Average time (seconds) an action sat in the queue before running"""
+        return self.total_wait / self.completed if self.completed else 0.0
+
+    def oldest_wait(self):
+        """How long (seconds) the action at the head of the queue has been waiting"""
+        with self.cond:
+            if not self.jobs:
+                return 0.0
+            return time.perf_counter() - self.jobs[0].submitted
+
+    async def run(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on the input thread and wait for its result"""
+        loop = asyncio.get_running_loop()
+        job = InputJob(loop, loop.create_future(), fn, args, kwargs)
+        return await self._submit(job)
+
+    async def run_coalesced(self, key, payload, fn, merge=add_payloads):
+        """Queue fn(payload), merging it with adjacent queued jobs that share the same key
+
+        Only jobs that sit next to each other in the queue are merged, so ordering against
+        other actions (e.g. a click between two moves) is preserved.
+        Returns how many requests were folded into the action that actually ran.
+        """
+        loop = asyncio.get_running_loop()
+        job = InputJob(loop, loop.create_future(), fn, (), {}, key=key, payload=payload, merge=merge)
+        return await self._submit(job)
+
+    async def _submit(self, job):
+        with self.cond:
+            if not self.running:
+                raise RuntimeError("Input worker is stopped")
+            if len(self.jobs) >= self.max_queue:
+                raise InputQueueFull(f"Input queue is full ({self.max_queue} actions waiting)")
+            self.jobs.append(job)
+            self.cond.notify()
+
+        return await job.future
+
+    def stop(self):
+        """Stop the worker thread, failing anything still queued"""
+        with self.cond:
+            self.running = False
+            pending = list(self.jobs)
+            self.jobs.clear()
+            self.cond.notify()
+        for job in pending:
+            job.loop.call_soon_threadsafe(self._resolve, job.future, None, RuntimeError("Input worker stopped"))
+
+    @staticmethod
+    def _resolve(future, result, error):
+        #The awaiting command may have been cancelled while we were busy
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _next_jobs(self):
+        """Pop the next job, plus any adjacent jobs it can be coalesced with"""
+        with self.cond:
+            while self.running and not self.jobs:
+                self.cond.wait()
+            if not self.running:
+                return None
+
+            head = self.jobs[0]
+            if head.key is not None:
+                #Hold the head open for the window so a burst of spam lands in one action
+                while self.running:
+                    remaining = head.submitted + self.coalesce_window - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+                if not self.running:
+                    return None
+
+            group = [self.jobs.popleft()]
+            while head.key is not None and self.jobs and self.jobs[0].key == head.key:
+                group.append(self.jobs.popleft())
+            return group
+
+    def _run(self):
+        while True:
+            group = self._next_jobs()
+            if group is None:
+                return
+
+            now = time.perf_counter()
+            for job in group:
+                wait = now - job.submitted
+                self.last_wait = wait
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+            head = group[0]
+            result, error = None, None
+            try:
+                if head.key is None:
+                    result = head.fn(*head.args, **head.kwargs)
+                else:
+                    payload = head.payload
+                    for job in group[1:]:
+                        payload = head.merge(payload, job.payload)
+                    head.fn(payload)
+                    result = len(group)
+            except Exception as e:
+                error = e
+            self.completed += len(group)
+            self.coalesced += len(group) - 1
+
+            for job in group:
+                try:
+                    job.loop.call_soon_threadsafe(self._resolve, job.future, result, error)
+                except RuntimeError:
+                    #Loop already closed (bot shutting down)
+                    pass
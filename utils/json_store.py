@@ -0,0 +1,37 @@
+import asyncio, json, os
+
+class JsonStore:
+    """A JSON file that's always rewritten whole, through a temp file and os.replace
+
+    A crash mid-write leaves the previous version in place rather than half a file, and saves are
+    serialized so an older snapshot can never land on disk after a newer one.
+    """
+
+    def __init__(self, path, what="file"):
+        self.path = path
+        self.what = what # for the error message when it can't be read, e.g. "upload journal"
+        self.lock = asyncio.Lock()
+
+    def read(self):
+        """The file's contents, or {} if it doesn't exist or can't be parsed. Blocking"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Failed to read {self.what}: {e}")
+            return {}
+
+    async def load(self):
+        return await asyncio.to_thread(self.read)
+
+    def write(self, data):
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+
+    async def save(self, snapshot):
+        """Write snapshot() off the loop. It's called once this save has the lock, so it's always current"""
+        async with self.lock:
+            await asyncio.to_thread(self.write, snapshot())
@@ -0,0 +1,177 @@
+import time
+import cv2
+import numpy as np
+
+DEFAULT_SCALES = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+MIN_COARSE_SIDE = 12 #Don't shrink a template below this many pixels for the coarse pass
+MIN_TEMPLATE_SIDE = 4 #Scaled templates smaller than this are useless and skipped
+COARSE_CANDIDATES = 20 #Peaks per scale that get refined at full resolution
+
+class Match:
+    """A single template hit in screen coordinates"""
+
+    def __init__(self, x, y, w, h, score, scale):
+        self.x = int(x)
+        self.y = int(y)
+        self.w = int(w)
+        self.h = int(h)
+        self.score = float(score)
+        self.scale = scale
+
+    @property
+    def center(self):
+        return self.x + self.w // 2, self.y + self.h // 2
+
+    def __repr__(self):
+        return f"Match(x={self.x}, y={self.y}, w={self.w}, h={self.h}, score={self.score:.3f}, scale={self.scale})"
+
+def to_gray(image):
+    """RGB -> single channel. Already-gray images are returned as-is"""
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+def build_pyramid(image, levels):
+    """[image, image/2, image/4, ...] with up to `levels` extra downscaled levels"""
+    pyramid = [image]
+    for _ in range(levels):
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+class Template:
+    """A template image pre-resized to every search scale, each with its own coarse pyramid
+
+    pyramids maps scale -> [full res, 1/2, 1/4, ...]. Levels stop once the template would
+    drop below MIN_COARSE_SIDE, so small templates just get fewer (or no) coarse levels.
+    """
+
+    def __init__(self, pyramids, grayscale=True):
+        self.pyramids = pyramids
+        self.grayscale = grayscale
+
+    @classmethod
+    def from_image(cls, image, scales=DEFAULT_SCALES, levels=2, grayscale=True):
+        base = to_gray(image) if grayscale else image
+        h, w = base.shape[:2]
+        pyramids = {}
+
+        for scale in scales:
+            sw, sh = round(w * scale), round(h * scale)
+            if min(sw, sh) < MIN_TEMPLATE_SIDE:
+                continue
+            interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            scaled = base if scale == 1 else cv2.resize(base, (sw, sh), interpolation=interp)
+
+            pyramid = [np.ascontiguousarray(scaled)]
+            while len(pyramid) <= levels and min(pyramid[-1].shape[:2]) // 2 >= MIN_COARSE_SIDE:
+                pyramid.append(cv2.pyrDown(pyramid[-1]))
+            pyramids[scale] = pyramid
+
+        return cls(pyramids, grayscale)
+
+    @property
+    def max_level(self):
+        return max((len(p) - 1 for p in self.pyramids.values()), default=0)
+
+def find_peaks(scores, threshold, limit):
+    """Local maxima of a match-score map above threshold, best first, as (score, y, x) arrays"""
+    peaks = (scores >= threshold) & (scores == cv2.dilate(scores, np.ones((3, 3), np.uint8)))
+    ys, xs = np.nonzero(peaks)
+    values = scores[ys, xs]
+    order = np.argsort(values)[::-1][:limit]
+    return values[order], ys[order], xs[order]
+
+def non_max_suppression(matches, overlap=0.3):
+    """Drop matches that overlap a better-scoring one by more than `overlap` IoU"""
+    if not matches:
+        return []
+
+    boxes = np.array([(m.x, m.y, m.x + m.w, m.y + m.h) for m in matches], dtype=np.float32)
+    scores = np.array([m.score for m in matches], dtype=np.float32)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(scores)[::-1]
+    keep = []
+
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+
+        ix1 = np.maximum(boxes[best, 0], boxes[rest, 0])
+        iy1 = np.maximum(boxes[best, 1], boxes[rest, 1])
+        ix2 = np.minimum(boxes[best, 2], boxes[rest, 2])
+        iy2 = np.minimum(boxes[best, 3], boxes[rest, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / (areas[best] + areas[rest] - inter)
+        order = rest[iou <= overlap]
+
+    return [matches[i] for i in keep]
+
+def locate(screen, template, threshold=0.8, region=None, coarse_slack=0.15, overlap=0.3):
+    """Find every placement of template on screen scoring >= threshold
+
+    screen is an RGB (or gray) array of the whole screen, region an optional (x, y, w, h) to
+    restrict the search to. Each scale is matched on a downscaled copy first, and only the
+    best coarse peaks are re-scored at full resolution in a small window around them.
+
+    Returns (matches best first, timings in ms).
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    ox, oy = 0, 0
+    if region:
+        ox, oy, rw, rh = region
+        screen = screen[oy:oy + rh, ox:ox + rw]
+    if template.grayscale:
+        screen = to_gray(screen)
+    elif screen.ndim == 2:
+        screen = cv2.cvtColor(screen, cv2.COLOR_GRAY2RGB)
+    screen = np.ascontiguousarray(screen)
+    screen_pyramid = build_pyramid(screen, template.max_level)
+    H, W = screen.shape[:2]
+    timings["prepare"] = (time.perf_counter() - start) * 1000
+
+    t = time.perf_counter()
+    matches = []
+    for scale, pyramid in template.pyramids.items():
+        th, tw = pyramid[0].shape[:2]
+        if th > H or tw > W:
+            continue
+
+        #Coarsest level both the template and the search area can support
+        level = len(pyramid) - 1
+        while level and (pyramid[level].shape[0] > screen_pyramid[level].shape[0]
+                         or pyramid[level].shape[1] > screen_pyramid[level].shape[1]):
+            level -= 1
+
+        scores = cv2.matchTemplate(screen_pyramid[level], pyramid[level], cv2.TM_CCOEFF_NORMED)
+        np.nan_to_num(scores, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+
+        if level == 0:
+            values, ys, xs = find_peaks(scores, threshold, COARSE_CANDIDATES)
+            matches.extend(Match(x + ox, y + oy, tw, th, v, scale) for v, y, x in zip(values, ys, xs))
+            continue
+
+        #Refine each coarse peak at full resolution in a window covering the downscale error
+        factor = 2 ** level
+        pad = factor + 2
+        _, ys, xs = find_peaks(scores, threshold - coarse_slack, COARSE_CANDIDATES)
+        for cy, cx in zip(ys, xs):
+            fx, fy = cx * factor, cy * factor
+            x0, y0 = max(0, fx - pad), max(0, fy - pad)
+            x1, y1 = min(W - tw, fx + pad), min(H - th, fy + pad)
+            window = screen[y0:y1 + th, x0:x1 + tw]
+            fine = cv2.matchTemplate(window, pyramid[0], cv2.TM_CCOEFF_NORMED)
+            np.nan_to_num(fine, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+            _, score, _, (lx, ly) = cv2.minMaxLoc(fine)
+            if score >= threshold:
+                matches.append(Match(x0 + lx + ox, y0 + ly + oy, tw, th, score, scale))
+    timings["match"] = (time.perf_counter() - t) * 1000
+
+    t = time.perf_counter()
+    matches = non_max_suppression(matches, overlap)
+    timings["nms"] = (time.perf_counter() - t) * 1000
+    timings["total"] = (time.perf_counter() - start) * 1000
+
+    return matches, timings
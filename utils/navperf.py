@@ -0,0 +1,95 @@
+from collections import deque
+from urllib.parse import urlparse
+
+#Reads the page's Navigation Timing entry (plus url/title, so callers need no second round trip).
+#time_origin identifies the document, so a caller polling a navigation can tell the new page from the old one
+NAV_TIMING_JS = """
+const out = {
+    url: location.href, title: document.title, ready_state: document.readyState,
+    time_origin: performance.timeOrigin, timing: null,
+};
+const nav = performance.getEntriesByType("navigation")[0];
+if (nav) {
+    out.timing = {
+        dns: nav.domainLookupEnd - nav.domainLookupStart,
+        connect: nav.connectEnd - nav.connectStart,
+        ttfb: nav.responseStart - nav.requestStart,
+        dom_content_loaded: nav.domContentLoadedEventEnd - nav.startTime,
+        load: nav.loadEventEnd - nav.startTime,
+    };
+}
+return out;
+"""
+
+#Browser phases from Navigation Timing, then our own side: queued behind other driver calls, and the driver call itself
+PHASES = ["dns", "connect", "ttfb", "dom_content_loaded", "load", "queue", "driver"]
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+class NavPerf:
+    """Rolling per-domain samples of navigation timings (ms), for p50/p95 reporting"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self.domains = {} # domain -> {phase: deque of ms}
+
+    @staticmethod
+    def domain(url):
+        host = urlparse(url).hostname or "unknown"
+        return host[4:] if host.startswith("www.") else host
+
+    def record(self, url, browser_timing, queue_ms, driver_ms):
+        phases = self.domains.setdefault(self.domain(url), {
+            phase: deque(maxlen=self.window) for phase in PHASES
+        })
+        samples = dict(browser_timing or {})
+        samples["queue"] = queue_ms
+        samples["driver"] = driver_ms
+        for phase, ms in samples.items():
+            #Unfinished phases come back negative, skip rather than skew the stats
+            if phase in phases and ms is not None and ms >= 0:
+                phases[phase].append(ms)
+
+    def summary(self, domain=None):
+        """{phase: (p50, p95, samples)} for one domain, or every domain pooled together"""
+        sources = [self.domains[domain]] if domain else list(self.domains.values())
+        result = {}
+        for phase in PHASES:
+            samples = sorted(ms for source in sources for ms in source[phase])
+            result[phase] = (percentile(samples, 50), percentile(samples, 95), len(samples))
+        return result
+
+    def busiest(self, limit=10):
+        """Domains with the most navigations recorded"""
+        counts = {domain: len(phases["driver"]) for domain, phases in self.domains.items()}
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+class ModeStats:
+    """Launch/load times and memory for one browser launch mode, so modes can be compared"""
+
+    def __init__(self, window=200):
+        self.launch_ms = deque(maxlen=window)
+        self.load_ms = deque(maxlen=window)
+        self.rss = deque(maxlen=window) # bytes for the whole browser process tree, sampled after each load
+
+    def record_load(self, browser_timing, rss):
+        if browser_timing and browser_timing.get("load", -1) >= 0:
+            self.load_ms.append(browser_timing["load"])
+        if rss:
+            self.rss.append(rss)
+
+    def summary(self):
+        launches, loads, rss = sorted(self.launch_ms), sorted(self.load_ms), sorted(self.rss)
+        return {
+            "launches": len(launches),
+            "launch_p50": percentile(launches, 50),
+            "loads": len(loads),
+            "load_p50": percentile(loads, 50),
+            "load_p95": percentile(loads, 95),
+            "rss_p50": percentile(rss, 50),
+            "rss_max": rss[-1] if rss else 0,
+        }
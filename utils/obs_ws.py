@@ -0,0 +1,177 @@
+import aiohttp, asyncio, base64, hashlib, itertools
+from utils.tasks import TaskSet
+
+#obs-websocket v5 opcodes
+OP_HELLO = 0
+OP_IDENTIFY = 1
+OP_IDENTIFIED = 2
+OP_EVENT = 5
+OP_REQUEST = 6
+OP_REQUEST_RESPONSE = 7
+OP_REQUEST_BATCH = 8
+OP_REQUEST_BATCH_RESPONSE = 9
+
+#Event subscription bits (pass to OBSClient(events=...))
+EVENTS_NONE = 0
+EVENTS_OUTPUTS = 1 << 6 # record/stream/replay buffer state, ReplayBufferSaved
+
+class OBSError(Exception):
+    """A request OBS answered with a failure status"""
+
+    def __init__(self, request_type, code, comment=None):
+        super().__init__(f"{request_type} failed ({code}){': ' + comment if comment else ''}")
+        self.request_type = request_type
+        self.code = code
+
+def _auth_string(password, salt, challenge):
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode()).digest()).decode()
+    return base64.b64encode(hashlib.sha256((secret + challenge).encode()).digest()).decode()
+
+class OBSClient:
+    """asyncio client for the obs-websocket v5 protocol
+
+    One connection carries every request: each gets a requestId and a future, and a single reader
+    task resolves them as responses come back in whatever order OBS sends them. batch() sends
+    several requests in one RequestBatch message, so they cost one round trip between them.
+    Events are passed to handlers registered with on().
+    """
+
+    def __init__(self, host="localhost", port=4455, password=None, events=EVENTS_NONE, timeout=5):
+        self.url = f"ws://{host}:{port}"
+        self.password = password or ""
+        self.events = events
+        self.timeout = timeout
+        self.session = None
+        self.ws = None
+        self.reader = None
+        self.pending = {} # requestId -> future
+        self.handlers = {} # eventType -> [callback(event_data)]
+        self.tasks = TaskSet() # running coroutine handlers
+        self.ids = itertools.count(1)
+        self.connect_lock = asyncio.Lock()
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    def on(self, event_type, callback):
+        """Call callback(event_data) for every event_type event. Callbacks can be plain functions or coroutines"""
+        self.handlers.setdefault(event_type, []).append(callback)
+
+    async def connect(self):
+        """Open the connection and identify, unless already connected"""
+        async with self.connect_lock:
+            if self.connected:
+                return
+            if self.session is None or self.session.closed:
+                self.session = aiohttp.ClientSession()
+
+            ws = await asyncio.wait_for(self.session.ws_connect(self.url, protocols=("obswebsocket.json",)), self.timeout)
+            try:
+                hello = await ws.receive_json(timeout=self.timeout)
+                if hello.get("op") != OP_HELLO:
+                    raise ConnectionError(f"Expected Hello from OBS, got op {hello.get('op')}")
+
+                identify = {"rpcVersion": 1, "eventSubscriptions": self.events}
+                auth = hello["d"].get("authentication")
+                if auth:
+                    identify["authentication"] = _auth_string(self.password, auth["salt"], auth["challenge"])
+                await ws.send_json({"op": OP_IDENTIFY, "d": identify})
+
+                identified = await ws.receive_json(timeout=self.timeout)
+                if identified.get("op") != OP_IDENTIFIED:
+                    raise ConnectionError("OBS rejected the connection, check OBS_PASSWORD")
+            except BaseException:
+                await ws.close()
+                raise
+
+            self.ws = ws
+            self.reader = asyncio.create_task(self._read(ws))
+
+    async def _read(self, ws):
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                #One bad frame shouldn't take the whole connection down with it
+                try:
+                    payload = message.json()
+                    op, data = payload.get("op"), payload.get("d") or {}
+                    if op in (OP_REQUEST_RESPONSE, OP_REQUEST_BATCH_RESPONSE):
+                        future = self.pending.pop(data.get("requestId"), None)
+                        if future and not future.done():
+                            future.set_result(data)
+                    elif op == OP_EVENT:
+                        self._dispatch(data.get("eventType"), data.get("eventData") or {})
+                except Exception as e:
+                    print(f"Ignoring bad message from OBS: {e}")
+        finally:
+            #Close our end too, so connected goes False and the next request reconnects
+            if not ws.closed:
+                await ws.close()
+            #Connection gone, nothing still waiting will ever get an answer
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Lost connection to OBS (close code {ws.close_code})"))
+            self.pending.clear()
+
+    def _dispatch(self, event_type, event_data):
+        for callback in self.handlers.get(event_type, []):
+            try:
+                result = callback(event_data)
+                if asyncio.iscoroutine(result):
+                    self.tasks.spawn(result)
+            except Exception as e:
+                print(f"OBS {event_type} handler error: {e}")
+
+    async def _send(self, op, data):
+        if not self.connected:
+            await self.connect()
+        request_id = str(next(self.ids))
+        data["requestId"] = request_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.ws.send_json({"op": op, "d": data})
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    @staticmethod
+    def _result(response):
+        status = response["requestStatus"]
+        if not status["result"]:
+            raise OBSError(response["requestType"], status["code"], status.get("comment"))
+        return response.get("responseData") or {}
+
+    async def request(self, request_type, data=None):
+        """Send one request and return its responseData. Raises OBSError if OBS reports a failure"""
+        request = {"requestType": request_type}
+        if data:
+            request["requestData"] = data
+        return self._result(await self._send(OP_REQUEST, request))
+
+    async def batch(self, *requests, halt_on_failure=False):
+        """Send several (request_type, data) requests as one RequestBatch and return their responseData in order
+
+        OBS runs them in order. Raises OBSError for the first one that failed.
+        """
+        items = []
+        for request_type, data in requests:
+            item = {"requestType": request_type}
+            if data:
+                item["requestData"] = data
+            items.append(item)
+        response = await self._send(OP_REQUEST_BATCH, {"haltOnFailure": halt_on_failure, "requests": items})
+        return [self._result(result) for result in response["results"]]
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+            self.ws = None
+        if self.reader:
+            await asyncio.gather(self.reader, return_exceptions=True)
+            self.reader = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,18 @@
+import psutil
+
+def tree_rss(pid):
+    """Total RSS in bytes of pid and every process under it, and how many processes that was
+
+    For the browser that's geckodriver, Firefox and all of its content processes. Processes that
+    exit while we're walking the tree are skipped. Shared pages are counted once per process, so
+    this overstates the real footprint a little, but consistently.
+    """
+    root = psutil.Process(pid)
+    total = count = 0
+    for proc in [root] + root.children(recursive=True):
+        try:
+            total += proc.memory_info().rss
+            count += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return total, count
@@ -0,0 +1,177 @@
+import asyncio, os, time
+from sortedcontainers import SortedKeyList
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError: #Optional, we fall back to polling the directory
+    Observer = None
+    FileSystemEventHandler = object
+
+VIDEO_EXTENSIONS = {".mp4", ".mkv", ".flv", ".mov"}
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+def scan(directory):
+    """{path: (mtime, size)} for every video directly in directory. scandir hands back the stat on Windows for free"""
+    found = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and is_video(entry.name):
+                stat = entry.stat()
+                found[entry.path] = (stat.st_mtime, stat.st_size)
+    return found
+
+class _Forwarder(FileSystemEventHandler):
+    """Passes watchdog's events (on its own thread) over to the index on the event loop"""
+
+    def __init__(self, index, loop):
+        self.index = index
+        self.loop = loop
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        if event.event_type in ("created", "modified", "closed"):
+            self.loop.call_soon_threadsafe(self.index.touch, event.src_path)
+        elif event.event_type == "deleted":
+            self.loop.call_soon_threadsafe(self.index.discard, event.src_path)
+        elif event.event_type == "moved":
+            self.loop.call_soon_threadsafe(self.index.discard, event.src_path)
+            self.loop.call_soon_threadsafe(self.index.touch, event.dest_path)
+
+class RecordIndex:
+    """Video files in a recording directory, kept sorted by mtime as they come and go
+
+    One scan at start, then filesystem notifications (watchdog) - or a periodic rescan if watchdog
+    isn't installed. A file only joins the index once its size has held still for stable_seconds,
+    so half-written recordings are never handed out. newest() is O(1) and since() is O(log n).
+    """
+
+    def __init__(self, stable_seconds=1.0, poll_interval=2.0):
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.directory = None
+        self.entries = SortedKeyList(key=lambda entry: entry[0]) # (mtime, path, size)
+        self.files = {} # path -> entry
+        self.pending = {} # path -> (size, when it last changed) for files still being written
+        self.observer = None
+        self.tasks = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def watching(self):
+        return "watchdog" if self.observer else "polling"
+
+    def newest(self):
+        """Path of the most recent finished recording, or None"""
+        return self.entries[-1][1] if self.entries else None
+
+    def since(self, timestamp):
+        """(mtime, path, size) of every finished recording modified after timestamp, oldest first"""
+        return list(self.entries.irange_key(min_key=timestamp, inclusive=(False, True)))
+
+    def _add(self, path, mtime, size):
+        self.discard(path)
+        entry = (mtime, path, size)
+        self.entries.add(entry)
+        self.files[path] = entry
+
+    def discard(self, path):
+        path = os.path.normpath(path)
+        self.pending.pop(path, None)
+        entry = self.files.pop(path, None)
+        if entry:
+            self.entries.remove(entry)
+
+    def touch(self, path):
+        """Something happened to path - hold it back until its size settles"""
+        path = os.path.normpath(path)
+        if is_video(path) and os.path.dirname(path) == self.directory:
+            self.pending[path] = (-1, time.monotonic())
+
+    def _settle(self):
+        """Stat the pending files, promoting any whose size hasn't moved for stable_seconds. Runs off the loop"""
+        now = time.monotonic()
+        settled, changed, gone = [], {}, []
+        for path, (size, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                gone.append(path)
+                continue
+            if stat.st_size != size:
+                changed[path] = (stat.st_size, now)
+            elif now - since >= self.stable_seconds:
+                settled.append((path, stat.st_mtime, stat.st_size))
+        return settled, changed, gone
+
+    async def _settle_loop(self):
+        while True:
+            await asyncio.sleep(min(0.5, self.stable_seconds))
+            if not self.pending:
+                continue
+            settled, changed, gone = await asyncio.to_thread(self._settle)
+            for path in gone:
+                self.discard(path)
+            for path, state in changed.items():
+                if path in self.pending:
+                    self.pending[path] = state
+            for path, mtime, size in settled:
+                if path in self.pending:
+                    self._add(path, mtime, size)
+
+    async def _poll_loop(self):
+        """Without watchdog: rescan every poll_interval and feed the differences through as events"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                found = await asyncio.to_thread(scan, self.directory)
+            except OSError as e:
+                print(f"Failed to scan {self.directory}: {e}")
+                continue
+            for path in list(self.files):
+                if path not in found:
+                    self.discard(path)
+            for path, (mtime, size) in found.items():
+                entry = self.files.get(path)
+                if path not in self.pending and (entry is None or entry[0] != mtime or entry[2] != size):
+                    self.touch(path)
+
+    async def start(self, directory):
+        """(Re)build the index for directory and keep it up to date"""
+        self.stop()
+        self.directory = os.path.normpath(directory)
+        self.entries.clear()
+        self.files.clear()
+        self.pending.clear()
+
+        start = time.perf_counter()
+        found = await asyncio.to_thread(scan, self.directory)
+        cutoff = time.time() - self.stable_seconds
+        for path, (mtime, size) in found.items():
+            if mtime < cutoff:
+                self._add(path, mtime, size)
+            else:
+                self.touch(path) # could still be mid-write
+        print(f"Indexed {len(found)} recordings in {self.directory} in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        self.tasks.append(asyncio.create_task(self._settle_loop()))
+        if Observer is not None:
+            self.observer = Observer()
+            self.observer.schedule(_Forwarder(self, asyncio.get_running_loop()), self.directory, recursive=False)
+            self.observer.daemon = True
+            self.observer.start()
+        else:
+            self.tasks.append(asyncio.create_task(self._poll_loop()))
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        if self.observer:
+            self.observer.stop()
+            self.observer = None
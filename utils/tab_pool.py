@@ -0,0 +1,115 @@
+import time
+from contextlib import contextmanager
+
+class TabsBusy(Exception):
+    """Raised when every tab is mid-operation and there's no room for another"""
+    pass
+
+class Tab:
+    """One browser tab (window handle) and what we last saw in it"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.last_used = time.monotonic()
+        self.busy = 0 # operations in flight on this tab
+        self.url = ""
+        self.title = ""
+
+    @contextmanager
+    def in_use(self):
+        """Mark the tab busy for the duration, so it can't be evicted mid-operation"""
+        self.busy += 1
+        self.last_used = time.monotonic()
+        try:
+            yield self
+        finally:
+            self.busy -= 1
+            self.last_used = time.monotonic()
+
+class TabPool:
+    """Bookkeeping for the tabs of one browser session, leased out per user or channel
+
+    Only tracks handles and leases - opening, switching and closing the actual windows is
+    up to the caller, on the driver thread. Tabs are numbered by the order they were opened.
+    """
+
+    def __init__(self, max_tabs=4, idle_timeout=0):
+        self.max_tabs = max(1, max_tabs)
+        self.idle_timeout = idle_timeout # seconds, 0 = only evict when full
+        self.tabs = {} # handle -> Tab, in opening order
+        self.leases = {} # owner -> handle
+        self.labels = {} # owner -> display name
+
+    def __len__(self):
+        return len(self.tabs)
+
+    @property
+    def full(self):
+        return len(self.tabs) >= self.max_tabs
+
+    def numbered(self):
+        return list(self.tabs.values())
+
+    def owners(self, handle):
+        return [self.labels.get(owner, str(owner)) for owner, leased in self.leases.items() if leased == handle]
+
+    def tab_for(self, owner):
+        handle = self.leases.get(owner)
+        return self.tabs.get(handle) if handle else None
+
+    def add(self, handle):
+        tab = self.tabs[handle] = Tab(handle)
+        return tab
+
+    def assign(self, owner, tab, label=None):
+        self.leases[owner] = tab.handle
+        if label:
+            self.labels[owner] = label
+        tab.last_used = time.monotonic()
+
+    def release(self, handle):
+        """Drop every lease on a tab, keeping the tab itself"""
+        for owner in [owner for owner, leased in self.leases.items() if leased == handle]:
+            del self.leases[owner]
+            self.labels.pop(owner, None)
+
+    def remove(self, handle):
+        """Forget a tab and drop every lease on it"""
+        self.tabs.pop(handle, None)
+        self.release(handle)
+
+    def retain(self, handles):
+        """Forget any tab that's no longer open (e.g. closed by hand). Returns how many were dropped"""
+        gone = [handle for handle in self.tabs if handle not in handles]
+        for handle in gone:
+            self.remove(handle)
+        return len(gone)
+
+    def unleased(self):
+        """Least recently used tab nobody holds a lease on, if any"""
+        leased = set(self.leases.values())
+        free = [tab for tab in self.tabs.values() if tab.handle not in leased]
+        return min(free, key=lambda tab: tab.last_used) if free else None
+
+    def lru_idle(self):
+        """Least recently used tab with nothing running in it"""
+        idle = [tab for tab in self.tabs.values() if not tab.busy]
+        if not idle:
+            raise TabsBusy(f"All {len(self.tabs)} tabs are busy, try again in a moment")
+        return min(idle, key=lambda tab: tab.last_used)
+
+    def expired(self):
+        """Idle tabs unused for longer than idle_timeout, oldest first - always leaves at least one tab"""
+        if not self.idle_timeout:
+            return []
+        now = time.monotonic()
+        stale = sorted(
+            (tab for tab in self.tabs.values() if not tab.busy and now - tab.last_used > self.idle_timeout),
+            key=lambda tab: tab.last_used,
+        )
+        return stale[:len(self.tabs) - 1]
+
+    def clear(self):
+        self.tabs.clear()
+        self.leases.clear()
+        self.labels.clear()
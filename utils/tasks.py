@@ -0,0 +1,24 @@
+import asyncio
+
+class TaskSet:
+    """Background tasks started and then left to run, held onto until they finish
+
+    The event loop only keeps weak references to tasks, so one nobody else holds can be
+    garbage collected mid-run.
+    """
+
+    def __init__(self):
+        self.tasks = set()
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
@@ -0,0 +1,110 @@
+import json, os, re, time
+import numpy as np
+from utils.locator import Template
+
+NAME_PATTERN = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+class TemplateLibrary:
+    """Named !locate templates, preprocessed once and kept on disk
+
+    Each template is stored as two files:
+      <name>.npy  - every grayscale pyramid level, flattened back to back into one uint8 buffer
+      <name>.json - the shape and offset of each level inside that buffer
+
+    At load the buffer is memory-mapped and every level is a zero-copy view into it, so
+    using a saved template costs no decoding or resizing at all.
+    """
+
+    def __init__(self, directory, scales, levels):
+        self.directory = directory
+        self.scales = scales
+        self.levels = levels
+        self.templates = {} # name -> Template
+        self.meta = {} # name -> metadata dict
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def normalize(name: str):
+        name = name.lower()
+        if not NAME_PATTERN.match(name):
+            raise ValueError("Template names can only use letters, numbers, - and _ (max 32 chars)")
+        return name
+
+    def _paths(self, name):
+        base = os.path.join(self.directory, name)
+        return base + ".npy", base + ".json"
+
+    def load_all(self):
+        """Memory-map every template in the library directory"""
+        for file in os.listdir(self.directory):
+            if not file.endswith(".json"):
+                continue
+            name = file[:-5]
+            try:
+                self._load(name)
+            except Exception as e:
+                print(f"Failed to load template {name}: {e}")
+        return len(self.templates)
+
+    def _load(self, name):
+        data_path, meta_path = self._paths(name)
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+
+        buffer = np.load(data_path, mmap_mode="r")
+        pyramids = {}
+        for scale, levels in meta["levels"].items():
+            pyramids[float(scale)] = [
+                buffer[offset:offset + h * w].reshape(h, w) for h, w, offset in levels
+            ]
+
+        self.templates[name] = Template(pyramids, grayscale=True)
+        self.meta[name] = meta
+
+    def save(self, name, image):
+        """Build the pyramids for an RGB/gray image and write them to disk"""
+        template = Template.from_image(image, self.scales, self.levels, grayscale=True)
+
+        levels = {}
+        chunks = []
+        offset = 0
+        for scale, pyramid in template.pyramids.items():
+            levels[str(scale)] = []
+            for level in pyramid:
+                h, w = level.shape
+                levels[str(scale)].append((h, w, offset))
+                chunks.append(level.ravel())
+                offset += h * w
+
+        meta = {
+            "name": name,
+            "width": int(image.shape[1]),
+            "height": int(image.shape[0]),
+            "bytes": offset,
+            "created": time.time(),
+            "levels": levels,
+        }
+
+        data_path, meta_path = self._paths(name)
+        #Drop any mapping of the old version first, Windows won't replace a mapped file
+        self.templates.pop(name, None)
+        np.save(data_path, np.concatenate(chunks))
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        self._load(name)
+        return meta
+
+    def delete(self, name):
+        if name not in self.templates:
+            return False
+        self.templates.pop(name)
+        self.meta.pop(name, None)
+        for path in self._paths(name):
+            if os.path.exists(path):
+                os.remove(path)
+        return True
+
+    def get(self, name):
+        return self.templates.get(name)